@@ -3,7 +3,7 @@ from nltk import NaiveBayesClassifier, DecisionTreeClassifier
 from nltk.metrics import precision, recall, f_measure
 from nltk.classify import apply_features, accuracy
 from nltk.classify.scikitlearn import SklearnClassifier
-from analytics.utils import clean_html_tags, shuffled, tokenize_and_stem
+from analytics.utils import clean_html_tags, shuffled, get_text_preprocessor
 from analytics.concept_extraction import ConceptExtractor
 from sklearn.svm import LinearSVC
 from sklearn.ensemble import RandomForestClassifier
@@ -216,7 +216,7 @@ class DocumentClassifier():
         return features
 
 
-    def train_classifier(self, dev_docs):
+    def train_classifier(self, dev_docs, tagged_dev_docs=None):
         '''
         Create the features vocabulary from 'dev docs', 
         Split 'dev docs', train the classifier with 'train docs',
@@ -226,15 +226,19 @@ class DocumentClassifier():
         ----------
         dev_docs: iterable
             An iterable which yields a list of strings
+
+        tagged_dev_docs: list, None by default
+            The (token, part-of-speech tag) tuples of each 'dev doc', if
+            they were already computed
         '''
         # create vocabulary for feature extraction
         ce = ConceptExtractor(num_concepts=self.vocab_size, 
                               language=self.language)
-        ce.extract_concepts([t for (t,c) in dev_docs])
+        ce.extract_concepts([t for (t,c) in dev_docs], tagged_dev_docs)
         self._vocab = sorted([c for (c,f) in ce.common_concepts], key=str.lower)
         if (self.stem):
-            self._vocab = [tokenize_and_stem(w, language=self.language)[0] \
-                                                    for w in self._vocab]
+            preprocessor = get_text_preprocessor(self.language, stem=True)
+            self._vocab = [preprocessor.tokenize(w)[0] for w in self._vocab]
         self.cross_validation_train(dev_docs)
 
 
@@ -259,7 +263,7 @@ class DocumentClassifier():
             self._f_measure[cat] = f_measure(refsets[cat], testsets[cat])
 
 
-    def classify_docs(self, docs):
+    def classify_docs(self, docs, tagged_docs=None):
         '''
         First train the classifier with the labeled data.
         Then classifies the unlabeled data.
@@ -268,11 +272,19 @@ class DocumentClassifier():
         ----------
         docs: iterable
             An iterable which yields a list of strings
+
+        tagged_docs: list, None by default
+            The (token, part-of-speech tag) tuples of each doc, if they 
+            were already computed
         '''
 
         dev_docs = [(t, c) for (t, c) in docs if c!=""]
         unlabeled_docs = [t for (t, c) in docs if c==""]
-        self.train_classifier(dev_docs)
+        tagged_dev_docs = None
+        if tagged_docs is not None:
+            tagged_dev_docs = [tg for ((t, c), tg) in zip(docs, tagged_docs) 
+                               if c!=""]
+        self.train_classifier(dev_docs, tagged_dev_docs)
         self.eval_classifier()
         results = []
         for doc in unlabeled_docs:
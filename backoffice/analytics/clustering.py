@@ -6,27 +6,235 @@ Created on Tue Oct 17 16:17:21 2017
 @author: jorgesaldivar
 """
 
+import hashlib
+import json
+import os
+import pickle
+import time
+from collections import Counter
 import numpy as np
 import pandas as pd
-import re
+import scipy.sparse as sp
+from multiprocessing import Pool, cpu_count
 from sklearn.feature_extraction.text import TfidfVectorizer, CountVectorizer
-from sklearn.cluster import KMeans, AgglomerativeClustering
-from sklearn.manifold import MDS
+from sklearn.cluster import KMeans, MiniBatchKMeans, AgglomerativeClustering
 from sklearn import metrics
-from sklearn.metrics.pairwise import cosine_similarity
-from analytics.utils import tokenize_and_remove_stop_words, tokenize_and_stem,\
-                  download_stop_words
+from sklearn.decomposition import TruncatedSVD
+from sklearn.neighbors import kneighbors_graph
+from sklearn.preprocessing import normalize
+from analytics.utils import (
+    tokenize_corpus, pos_tag_corpus, get_text_preprocessor
+)
+from analytics.projection import project, MEMORY_BUDGET
+from analytics.linkage import LinkageTree
+from analytics.hashing import HashingTfidfVectorizer, N_FEATURES
 from analytics.concept_extraction import ConceptExtractor
 
 
+# Number of dimensions of the LSA representation on which the 
+# agglomerative-knn algorithm builds its connectivity graph
+KNN_SVD_COMPONENTS = 100
+
+# Maximum number of documents used to compute the silhouette score
+SILHOUETTE_SAMPLE_SIZE = 5000
+
+VECTORIZERS = ('tfidf', 'hashing')
+
+# Metrics used to select the number of clusters automatically
+SELECTION_METRICS = ('silhouette', 'calinski-harabaz')
+
+# Methods to compute the top terms of each cluster
+TOP_TERMS_METHODS = ('pos', 'tfidf')
+
+# Algorithms whose merge tree can be cached and cut at any number of clusters
+HIERARCHICAL_ALGORITHMS = ('agglomerative', 'agglomerative-knn')
+
+
+def calinski_harabaz_score(matrix, labels):
+    '''
+    Compute the Calinski and Harabaz score of a clustering directly on a 
+    sparse (or dense) matrix, without densifying it. Only the centroids of 
+    the clusters, a dense array of shape (n_clusters, n_features), are 
+    kept in memory.
+    '''
+    labels = np.asarray(labels)
+    num_docs = matrix.shape[0]
+    clusters, labels_idx = np.unique(labels, return_inverse=True)
+    num_clusters = len(clusters)
+    if not 1 < num_clusters < num_docs:
+        raise ValueError('Number of labels is {}. Valid values are 2 to '
+                         'n_samples - 1 (inclusive)'.format(num_clusters))
+    indicator = sp.csr_matrix((np.ones(num_docs, dtype=matrix.dtype), 
+                               (labels_idx, np.arange(num_docs))),
+                              shape=(num_clusters, num_docs))
+    sizes = np.asarray(indicator.sum(axis=1)).ravel()
+    sums = indicator.dot(matrix)
+    if sp.issparse(sums):
+        sums = sums.toarray()
+    # dispersions are accumulated in float64 whatever the type of matrix
+    centroids = np.asarray(sums, dtype=np.float64) / sizes[:, np.newaxis]
+    mean = np.asarray(matrix.mean(axis=0), dtype=np.float64).ravel()
+    if sp.issparse(matrix):
+        total_sq_norm = matrix.multiply(matrix).sum(dtype=np.float64)
+    else:
+        total_sq_norm = np.square(matrix).sum(dtype=np.float64)
+    # within-cluster dispersion: sum of squared distances to the centroids
+    within = total_sq_norm - (sizes * np.square(centroids).sum(axis=1)).sum()
+    between = (sizes * np.square(centroids - mean).sum(axis=1)).sum()
+    if within <= 0:
+        return 1.
+    return between * (num_docs - num_clusters) / \
+           (within * (num_clusters - 1.))
+
+
+def cluster_centroids(matrix, labels, num_clusters, sample_weight=None):
+    '''
+    Compute the (weighted) mean of the rows of matrix in each cluster. 
+    Clusters without rows get a centroid of zeros.
+    '''
+    labels = np.asarray(labels)
+    num_docs = matrix.shape[0]
+    if sample_weight is None:
+        sample_weight = np.ones(num_docs)
+    indicator = sp.csr_matrix((np.asarray(sample_weight, dtype=float), 
+                               (labels, np.arange(num_docs))),
+                              shape=(num_clusters, num_docs))
+    sizes = np.asarray(indicator.sum(axis=1)).ravel()
+    sums = indicator.dot(matrix)
+    if sp.issparse(sums):
+        sums = sums.toarray()
+    return np.asarray(sums) / np.maximum(sizes, 1)[:, np.newaxis]
+
+
+def silhouette_score(matrix, labels, sample_size=SILHOUETTE_SAMPLE_SIZE,
+                     random_state=1):
+    '''
+    Compute the silhouette score of a clustering on the sparse matrix. If 
+    there are more documents than sample_size, the score is computed on a 
+    random sample of sample_size documents.
+    '''
+    if sample_size is None or sample_size >= matrix.shape[0]:
+        sample_size = None
+    return metrics.silhouette_score(matrix, labels, metric='euclidean',
+                                    sample_size=sample_size,
+                                    random_state=random_state)
+
+
+class ClusteringModel:
+    '''
+    Fitted state of a DocumentClustering (the vectorizer, the optional LSA
+    reduction and the centroids of the clusters) needed to assign new 
+    documents to its clusters without fitting them again. Models are 
+    created with DocumentClustering.export_model() and can be pickled.
+    '''
+    
+    def __init__(self, vectorizer, svd, centroids, reduce=False, 
+                 language='english', context_words=[], consider_urls=False):
+        self.vectorizer = vectorizer
+        self.svd = svd
+        self.centroids = centroids
+        self.reduce = reduce
+        self.language = language
+        self.context_words = context_words
+        self.consider_urls = consider_urls
+    
+    def transform(self, stemmed_docs):
+        '''
+        Represent the stemmed documents in the space of the centroids
+        '''
+        matrix = self.vectorizer.transform(stemmed_docs)
+        if not self.reduce:
+            return matrix
+        if self.svd is None:
+            return normalize(matrix.toarray()).astype(matrix.dtype)
+        return normalize(self.svd.transform(matrix)).astype(matrix.dtype)
+    
+    def term_centroids(self):
+        '''
+        Centroids of the clusters in the space of the terms of the 
+        vectorizer (i.e., undoing the LSA reduction, if any)
+        '''
+        if self.reduce and self.svd is not None:
+            return self.centroids.dot(self.svd.components_)
+        return self.centroids
+    
+    def assign(self, docs, stemmed_docs=None):
+        '''
+        Assign each document to the cluster with the closest centroid.
+        
+        Returns
+        -------
+        labels : array with the cluster of each document
+        '''
+        if stemmed_docs is None:
+            stemmed_docs = tokenize_corpus(docs, language=self.language,
+                                           stem=True,
+                                           context_words=self.context_words,
+                                           join_words=True,
+                                           remove_urls=not self.consider_urls)
+        matrix = self.transform(stemmed_docs)
+        # squared euclidean distances without the norm of the documents,
+        # which doesn't change the closest centroid
+        distances = -2 * np.asarray(matrix.dot(self.centroids.T)) + \
+                    np.square(self.centroids).sum(axis=1)
+        return distances.argmin(axis=1)
+    
+    @property
+    def num_clusters(self):
+        return self.centroids.shape[0]
+
+
+def _extract_cluster_concepts(args):
+    # Worker function of DocumentClustering.top_terms_per_cluster(), the 
+    # concepts of each cluster are extracted in a different process
+    docs, tagged_docs, doc_weights, num_concepts, language, context_words, \
+        n_jobs = args
+    ce = ConceptExtractor(num_concepts=num_concepts, language=language, 
+                          context_words=context_words, n_jobs=n_jobs)
+    ce.extract_concepts(docs, tagged_docs, doc_weights)
+    return ce.common_concepts
+
+
+def _fit_and_score(dc, matrix, num_clusters):
+    '''
+    Fit a clustering with num_clusters clusters and score it.
+    '''
+    labels = dc._fit_model(matrix, num_clusters)
+    return labels, dc._score(matrix, labels), dc._model
+
+
+# DocumentClustering and matrix whose candidate numbers of clusters are 
+# fitted by the workers
+_selection_clustering = None
+_selection_matrix = None
+
+
+def _init_selection_worker(document_clustering, matrix):
+    global _selection_clustering, _selection_matrix
+    _selection_clustering = document_clustering
+    _selection_matrix = matrix
+
+
+def _fit_num_clusters(num_clusters):
+    '''
+    Fit and score a candidate number of clusters. Run by the worker 
+    processes of the automatic selection of the number of clusters, which
+    receive the matrix only once.
+    '''
+    return _fit_and_score(_selection_clustering, _selection_matrix, 
+                          num_clusters)
+
+
 class DocumentClustering:
     '''
     Cluster documents by similarity using the k-means algorithm.
     
     Parameters
     ----------
-    num_clusters : int, 5 by default
-        The number of clusters in which the documents will be grouped.
+    num_clusters : int or 'auto', 5 by default
+        The number of clusters in which the documents will be grouped. If 
+        'auto', every number of clusters in k_range is tried and the one 
+        with the best selection_metric is kept.
     
     context_words : list, empty list by default
         List of context-specific words that should notbe considered in the 
@@ -58,16 +266,125 @@ class DocumentClustering:
 
     algorithm: string, 'k-means' by default
         Clustering algorithm use to group documents
-        Currently available: k-means and agglomerative (hierarchical)
+        Currently available: k-means, minibatch-k-means, agglomerative 
+        (hierarchical) and agglomerative-knn (hierarchical on a LSA-reduced 
+        matrix, merging only documents connected in the k-nearest-neighbors
+        graph so it runs in memory linear in the number of documents)
     
-    '''
+    n_jobs: int, 1 by default
+        Number of processes used to tokenize the documents. If -1, all the 
+        CPUs are used.
+    
+    batch_size: int, 1000 by default
+        Number of documents of each mini batch when the algorithm is 
+        minibatch-k-means.
+    
+    streaming: boolean, False by default
+        If True and the algorithm is minibatch-k-means, the model is fitted
+        with a single pass over the tf-idf matrix consuming it in chunks of
+        batch_size documents, and labels are then assigned chunk by chunk.
+    
+    random_state: int, 1 by default
+        Seed used to initialize the centroids of the k-means algorithms and
+        to sample the documents of the silhouette score and the projection,
+        so the results of identical clusterings are the same. If None, 
+        every run is different.
+    
+    projection: string, 'auto' by default
+        Method used to project documents into two dimensions: mds, svd,
+        landmark-mds or auto to choose between mds and landmark-mds 
+        depending on the number of documents and memory_budget.
+    
+    memory_budget: int, MEMORY_BUDGET by default
+        Memory, in MB, available to project the documents.
+    
+    n_neighbors: int, 10 by default
+        Number of neighbors of each document in the connectivity graph of 
+        the agglomerative-knn algorithm.
+    
+    knn_svd_components: int, KNN_SVD_COMPONENTS by default
+        Number of dimensions of the LSA representation on which the 
+        agglomerative-knn algorithm builds its connectivity graph. Ignored
+        when n_components is set: the graph is then built on the LSA
+        representation of n_components dimensions.
+    
+    compute_metrics: boolean, True by default
+        Whether the silhouette and Calinski-Harabaz scores of the clustering
+        should be computed.
+    
+    silhouette_sample_size: int, SILHOUETTE_SAMPLE_SIZE by default
+        Maximum number of documents, sampled using random_state, used to 
+        compute the silhouette score. If None, all documents are used.
+    
+    vectorizer: string, 'tfidf' by default
+        How documents are converted to a tf-idf matrix: tfidf (one column
+        per term of the vocabulary) or hashing (n_features columns of 
+        hashed terms, so the vocabulary is never kept in memory; each 
+        column is shown as its most frequent term).
+    
+    n_features: int, N_FEATURES by default
+        Number of columns of the tf-idf matrix when vectorizer is hashing.
+    
+    dtype: string, 'float32' by default
+        Type of the values of the tf-idf matrix, kept by the LSA reduction,
+        the clustering algorithms, the metrics and the projection. 
+        float32 halves the memory used by the matrices of float64.
+    
+    n_components: int, None by default
+        If set, documents are clustered, scored and projected on a LSA 
+        representation of n_components dimensions (a truncated SVD of the 
+        tf-idf matrix with normalized rows) instead of on the tf-idf matrix.
+        The fitted vectorizer, the SVD and the reduced matrix are kept, so
+        every stage reuses them. Takes precedence over knn_svd_components.
+    
+    init_model: ClusteringModel, None by default
+        Model of a previous clustering (e.g., of an older version of the 
+        documents) whose centroids, mapped into the new vocabulary, 
+        initialize a single run of the k-means algorithms, so clusters keep 
+        their identities. Ignored if its number of clusters is different 
+        or the algorithm is hierarchical.
+    
+    k_range: tuple, (2, 10) by default
+        The lowest and highest number of clusters tried when num_clusters 
+        is 'auto'. The candidates are fitted in parallel using n_jobs 
+        processes.
+    
+    selection_metric: string, 'silhouette' by default
+        Metric used to choose the number of clusters when num_clusters is
+        'auto': silhouette (sampled with silhouette_sample_size) or 
+        calinski-harabaz.
+    
+    top_terms_method: string, 'pos' by default
+        How the top terms of each cluster are computed: pos (the most 
+        common nouns of the documents of the cluster, tagged and counted by
+        a ConceptExtractor per cluster, run in parallel using n_jobs 
+        processes) or tfidf (the terms with the largest sum of tf-idf 
+        weights in the cluster, computed from the tf-idf matrix and shown 
+        as the most frequent word of each stem).
     
-    _reg_exp_urls = r'^https?:\/\/.*[\r\n]*'
+    cache_dir: string, None by default
+        Directory where the hierarchical algorithms save the tf-idf matrix,
+        the full merge tree and the coordinates of the documents. Later
+        clusterings of the same documents with the same settings, but any
+        number of clusters, cut the saved tree instead of clustering the
+        documents again. The directory must be specific to the documents 
+        and to their preprocessing (e.g., the directory of a DatasetCorpus).
+    
+    '''
     
     def __init__(self, num_clusters=5, context_words=[], ngram_range=(1,1), 
                  min_df=0.1, max_df=0.9, consider_urls=False, 
                  language='english', algorithm="k-means", 
-                 use_idf=False):
+                 use_idf=False, n_jobs=1, batch_size=1000, streaming=False,
+                 random_state=1, projection='auto', 
+                 memory_budget=MEMORY_BUDGET, n_neighbors=10,
+                 knn_svd_components=KNN_SVD_COMPONENTS,
+                 compute_metrics=True,
+                 silhouette_sample_size=SILHOUETTE_SAMPLE_SIZE,
+                 vectorizer='tfidf', n_features=N_FEATURES, dtype='float32',
+                 n_components=None, init_model=None, k_range=(2, 10), 
+                 selection_metric='silhouette', top_terms_method='pos',
+                 cache_dir=None):
         self.num_clusters = num_clusters
         self.context_words = context_words
         self.ngram_range = ngram_range
@@ -76,22 +393,60 @@ class DocumentClustering:
         self.consider_urls = consider_urls
         self.language = language
         self.use_idf = use_idf
+        self.n_jobs = n_jobs
+        self.batch_size = batch_size
+        self.streaming = streaming
+        self.random_state = random_state
+        self.projection = projection
+        self.memory_budget = memory_budget
+        self.n_neighbors = n_neighbors
+        self.knn_svd_components = knn_svd_components
+        self.compute_metrics = compute_metrics
+        self.silhouette_sample_size = silhouette_sample_size
+        self.vectorizer_type = vectorizer
+        self.n_features = n_features
+        self.dtype = np.dtype(dtype)
+        self.n_components = n_components
+        self.init_model = init_model
+        self.k_range = k_range
+        self.selection_metric = selection_metric
+        self.top_terms_method = top_terms_method
+        self.cache_dir = cache_dir
         # properties
         self._docs = None
+        self._tagged_docs = None
+        self._tokenized_docs = None
         self._corpus = pd.DataFrame()
         self._model = None
         self._tfidf_matrix = {}
+        self._vectorizer = None
+        self._svd = None
+        self._reduced_matrix = None
         self._features = []
         self._feature_weights = {}
         self._num_docs_per_clusters = {}
         self._clusters = []
+        self._sample_weight = None
         self._algorithm = algorithm
         self._silhouette_score = 0
         self._calinski_harabaz_score = 0
-        # download stop words in case they weren't already downloaded
-        download_stop_words()
+        self._linkage_tree = None
+        self._coordinates = None
+        self._selected_num_clusters = num_clusters
+        self._k_scores = {}
     
-    def clustering(self, docs):
+    def __getstate__(self):
+        # the documents aren't needed to fit the candidate numbers of 
+        # clusters in other processes
+        state = self.__dict__.copy()
+        for name in ('_docs', '_tagged_docs', '_tokenized_docs', 
+                     '_tfidf_matrix', '_vectorizer', '_reduced_matrix', 
+                     '_coordinates'):
+            state[name] = None
+        return state
+    
+    def clustering(self, docs, stemmed_docs=None, tagged_docs=None,
+                   sample_weight=None, tokenized_docs=None):
         '''
         Cluster, by similarity, a collection of documents into groups.
         
@@ -100,25 +455,106 @@ class DocumentClustering:
         docs: iterable
             An iterable which yields a list of strings
         
+        stemmed_docs: list, None by default
+            The stems of each document joined by spaces, if they were 
+            already computed. If None, documents are tokenized and stemmed.
+        
+        tagged_docs: list, None by default
+            The (token, part-of-speech tag) tuples of each document, if they
+            were already computed. They are used to compute the top terms 
+            of each cluster.
+        
+        sample_weight: list, None by default
+            Number of times each document counts, e.g., the size of the 
+            group of near-duplicates represented by each document. Weights
+            are used by the k-means algorithms and to compute the top terms,
+            the hierarchical algorithms ignore them.
+        
+        tokenized_docs: list, None by default
+            The tokens of each document, if they were already computed. 
+            They are used to show the stems of the top terms as words when 
+            top_terms_method is tfidf and tagged_docs aren't given.
+        
         Returns
         -------
         self : DocumentClustering
         '''
         
         self._docs = docs
-        # clean and stem documents
-        stemmed_docs = []
-        for doc in self._docs:
-            if not self.consider_urls:
-                doc = re.sub(self._reg_exp_urls, '', doc, flags=re.MULTILINE)
-            stemmed_docs.append(tokenize_and_stem(doc, self.context_words,
-                                                  join_words=True,
-                                                  language=self.language))
-        # create td-idf matrix
-        tfidf_vectorizer = TfidfVectorizer(max_df=self.max_df, 
-                                            min_df=self.min_df,
-                                            use_idf=self.use_idf,
-                                            ngram_range=self.ngram_range)
+        self._tagged_docs = tagged_docs
+        self._tokenized_docs = tokenized_docs
+        if sample_weight is not None:
+            sample_weight = np.asarray(sample_weight)
+        self._sample_weight = sample_weight
+        if self.has_cached_tree():
+            self._load_cached_tree()
+            labels = self._select_num_clusters(self._document_matrix())
+        else:
+            # clean and stem documents
+            if stemmed_docs is None:
+                stemmed_docs = tokenize_corpus(self._docs, 
+                                               language=self.language,
+                                               stem=True, 
+                                               context_words=self.context_words,
+                                               join_words=True,
+                                               remove_urls=not self.consider_urls,
+                                               n_jobs=self.n_jobs)
+            self._vectorize(stemmed_docs)
+            # compute clusters
+            labels = self._select_num_clusters(self._document_matrix())
+            if self._uses_cache():
+                self._save_cached_tree()
+        self._clusters = labels.tolist()
+        # create a dictionary of the docs and their clusters
+        docs_clusters = {'docs': self._docs, 'cluster': self._clusters}
+        docs_clusters_df = pd.DataFrame(docs_clusters, index = [self._clusters] , 
+                                        columns = ['doc', 'cluster'])
+        # save the number of documents per cluster
+        self._num_docs_per_clusters = dict(docs_clusters_df['cluster']. \
+                                           value_counts())
+        if self.compute_metrics:
+            self._silhouette_score = silhouette_score(
+                                            self._document_matrix(), labels,
+                                            self.silhouette_sample_size,
+                                            self.random_state)
+            self._calinski_harabaz_score = calinski_harabaz_score(
+                                                 self._document_matrix(), 
+                                                 labels)
+        return self
+    
+    def _document_matrix(self):
+        '''
+        Matrix on which documents are clustered, scored and projected: the
+        LSA-reduced matrix if n_components is set, the tf-idf matrix 
+        otherwise.
+        '''
+        if self._reduced_matrix is not None:
+            return self._reduced_matrix
+        return self._tfidf_matrix
+    
+    def _vectorize(self, stemmed_docs):
+        '''
+        Compute the tf-idf matrix of the stemmed documents, the average 
+        weight of each feature and, if n_components is set, the LSA-reduced
+        matrix.
+        '''
+        if self.vectorizer_type == 'tfidf':
+            tfidf_vectorizer = TfidfVectorizer(max_df=self.max_df, 
+                                                min_df=self.min_df,
+                                                use_idf=self.use_idf,
+                                                ngram_range=self.ngram_range,
+                                                dtype=self.dtype)
+        elif self.vectorizer_type == 'hashing':
+            tfidf_vectorizer = HashingTfidfVectorizer(
+                                                n_features=self.n_features,
+                                                max_df=self.max_df, 
+                                                min_df=self.min_df,
+                                                use_idf=self.use_idf,
+                                                ngram_range=self.ngram_range,
+                                                dtype=self.dtype)
+        else:
+            raise Exception('Unknown vectorizer {}'.\
+                            format(self.vectorizer_type))
         #fit the vectorizer to ideas
         try:
             self._tfidf_matrix = tfidf_vectorizer.fit_transform(stemmed_docs)
@@ -130,32 +566,287 @@ class DocumentClustering:
                                                           to_dict(orient='records')
         except ValueError as error:
             raise Exception(error)
-        # compute clusters
+        # the terms discarded by min_df and max_df are kept only for 
+        # introspection, and make the vectorizer large to save
+        tfidf_vectorizer.stop_words_ = None
+        self._vectorizer = tfidf_vectorizer
+        if self.n_components:
+            self._svd, self._reduced_matrix = self._lsa(self._tfidf_matrix, 
+                                                        self.n_components)
+    
+    def _uses_cache(self):
+        return self.cache_dir is not None and \
+               self._algorithm in HIERARCHICAL_ALGORITHMS
+    
+    def _cache_path(self, name):
+        # every setting but the number of clusters changes the tree or the
+        # coordinates
+        settings = json.dumps([
+            self._algorithm, list(self.ngram_range), self.min_df, 
+            self.max_df, self.use_idf, self.n_neighbors,
+            self.knn_svd_components,
+            self.random_state, self.projection, self.memory_budget,
+            self.n_components, self.vectorizer_type, self.n_features,
+            self.dtype.name
+        ])
+        key = hashlib.sha1(settings.encode('utf-8')).hexdigest()
+        return os.path.join(self.cache_dir, 'linkage-' + key, name)
+    
+    def _write_cache_file(self, name, write):
+        path = self._cache_path(name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = path + '.tmp.' + str(os.getpid())
+        with open(tmp_path, 'wb') as f:
+            write(f)
+        os.replace(tmp_path, path)
+    
+    def has_cached_tree(self):
+        '''
+        Whether the merge tree of the documents was already saved in 
+        cache_dir, in which case clustering() doesn't need the stemmed docs.
+        '''
+        return self._uses_cache() and os.path.exists(self._cache_path('tree.npz'))
+    
+    def _save_cached_tree(self):
+        self._write_cache_file('tfidf.npz', 
+                               lambda f: sp.save_npz(f, self._tfidf_matrix))
+        self._write_cache_file('features.json', lambda f: f.write(
+            json.dumps([self._features, self._feature_weights]).encode('utf-8')
+        ))
+        if self._reduced_matrix is not None:
+            self._write_cache_file('reduced.npy', lambda f: np.save(
+                f, self._reduced_matrix
+            ))
+        self._write_cache_file('vectorizer.pkl', lambda f: pickle.dump(
+            (self._vectorizer, self._svd), f, protocol=pickle.HIGHEST_PROTOCOL
+        ))
+        # the tree is written last, so its presence means the cache is complete
+        self._write_cache_file('tree.npz', self._linkage_tree.save)
+    
+    def _load_cached_tree(self):
+        '''
+        Load the saved tf-idf (and reduced) matrix, vectorizer and merge 
+        tree.
+        '''
+        self._tfidf_matrix = sp.load_npz(self._cache_path('tfidf.npz'))
+        with open(self._cache_path('features.json'), 'rb') as f:
+            self._features, self._feature_weights = json.loads(
+                f.read().decode('utf-8')
+            )
+        if self.n_components:
+            self._reduced_matrix = np.load(self._cache_path('reduced.npy'))
+        with open(self._cache_path('vectorizer.pkl'), 'rb') as f:
+            self._vectorizer, self._svd = pickle.load(f)
+        self._linkage_tree = LinkageTree.load(self._cache_path('tree.npz'))
+        coordinates_path = self._cache_path('coordinates.npy')
+        if os.path.exists(coordinates_path):
+            self._coordinates = np.load(coordinates_path)
+    
+    def _select_num_clusters(self, matrix):
+        '''
+        Cluster the rows of matrix into num_clusters groups or, if 
+        num_clusters is 'auto', into the number of groups in k_range with 
+        the best score. Return the label of each row.
+        '''
+        if self.num_clusters != 'auto':
+            self._selected_num_clusters = self.num_clusters
+            if self._linkage_tree is not None:
+                return self._linkage_tree.cut(self.num_clusters)
+            return self._fit_model(matrix, self.num_clusters)
+        if self.selection_metric not in SELECTION_METRICS:
+            raise Exception('Unknown selection metric {}'.\
+                            format(self.selection_metric))
+        min_k = max(2, self.k_range[0])
+        max_k = min(self.k_range[1], matrix.shape[0] - 1)
+        candidates = list(range(min_k, max_k + 1))
+        if not candidates:
+            raise Exception('Too few documents to select the number of '
+                            'clusters in {}'.format(self.k_range))
+        if self._algorithm in HIERARCHICAL_ALGORITHMS:
+            # a single tree is built and cut at each number of clusters
+            if self._linkage_tree is None:
+                self._fit_model(matrix, min_k)
+            results = []
+            for k in candidates:
+                labels = self._linkage_tree.cut(k)
+                results.append((labels, self._score(matrix, labels), 
+                                self._model))
+        else:
+            n_jobs = self.n_jobs
+            if n_jobs is None or n_jobs < 1:
+                n_jobs = cpu_count()
+            if n_jobs == 1:
+                results = [_fit_and_score(self, matrix, k) 
+                           for k in candidates]
+            else:
+                with Pool(processes=min(n_jobs, len(candidates)),
+                          initializer=_init_selection_worker,
+                          initargs=(self, matrix)) as pool:
+                    results = pool.map(_fit_num_clusters, candidates)
+        self._k_scores = {k: score for k, (labels, score, model) 
+                          in zip(candidates, results)}
+        scored = [k for k in candidates if self._k_scores[k] is not None]
+        best_k = max(scored, key=lambda k: self._k_scores[k]) \
+                 if scored else candidates[0]
+        labels, score, self._model = results[candidates.index(best_k)]
+        self._selected_num_clusters = best_k
+        return labels
+    
+    def _score(self, matrix, labels):
+        '''
+        Score a clustering with the selection metric. Return None if the 
+        clustering can't be scored (e.g., all documents are in one cluster).
+        '''
+        num_labels = len(np.unique(labels))
+        if not 1 < num_labels < matrix.shape[0]:
+            return None
+        if self.selection_metric == 'silhouette':
+            return float(silhouette_score(matrix, labels, 
+                                          self.silhouette_sample_size,
+                                          self.random_state))
+        return float(calinski_harabaz_score(matrix, labels))
+    
+    def _fit_model(self, matrix, num_clusters):
+        '''
+        Fit the clustering algorithm with num_clusters clusters to the rows 
+        of matrix and return the label of each row.
+        '''
         if self._algorithm == "agglomerative":
-            self._model = AgglomerativeClustering(n_clusters=self.num_clusters)
-            self._model.fit(self._tfidf_matrix.toarray())
+            self._model = AgglomerativeClustering(n_clusters=num_clusters,
+                                                  compute_full_tree=True)
+            self._model.fit(matrix.toarray() if sp.issparse(matrix) 
+                            else matrix)
+            self._linkage_tree = LinkageTree.from_model(self._model)
+            return self._linkage_tree.cut(num_clusters)
+        elif self._algorithm == "agglomerative-knn":
+            # documents are already reduced when n_components is set
+            if self.n_components:
+                reduced_matrix = matrix
+            else:
+                reduced_matrix = self._lsa(matrix, self.knn_svd_components)[1]
+            n_neighbors = min(self.n_neighbors, matrix.shape[0] - 1)
+            connectivity = kneighbors_graph(reduced_matrix, n_neighbors, 
+                                            include_self=False)
+            self._model = AgglomerativeClustering(n_clusters=num_clusters,
+                                                  connectivity=connectivity,
+                                                  compute_full_tree=True)
+            self._model.fit(reduced_matrix)
+            self._linkage_tree = LinkageTree.from_model(self._model)
+            return self._linkage_tree.cut(num_clusters)
         elif self._algorithm == "k-means":
-            self._model = KMeans(n_clusters=self.num_clusters)
-            self._model.fit(self._tfidf_matrix)
-        self._clusters = self._model.labels_.tolist()
-        # create a dictionary of the docs and their clusters
-        docs_clusters = {'docs': self._docs, 'cluster': self._clusters}
-        docs_clusters_df = pd.DataFrame(docs_clusters, index = [self._clusters] , 
-                                        columns = ['doc', 'cluster'])
-        # save the number of documents per cluster
-        self._num_docs_per_clusters = dict(docs_clusters_df['cluster']. \
-                                           value_counts())
-        self._silhouette_score =  metrics.silhouette_score(self._tfidf_matrix,
-                                                           self._model.labels_,
-                                                            metric='euclidean')
-        self._calinski_harabaz_score = metrics.calinski_harabaz_score(
-                                                 self._tfidf_matrix.toarray(),
-                                                 self._model.labels_)
-        return self
+            init = self._initial_centroids(num_clusters)
+            if init is not None:
+                self._model = KMeans(n_clusters=num_clusters, init=init,
+                                     n_init=1, random_state=self.random_state)
+            else:
+                self._model = KMeans(n_clusters=num_clusters, 
+                                     random_state=self.random_state)
+            self._model.fit(matrix, sample_weight=self._sample_weight)
+        elif self._algorithm == "minibatch-k-means":
+            init = self._initial_centroids(num_clusters)
+            if init is not None:
+                self._model = MiniBatchKMeans(n_clusters=num_clusters,
+                                              init=init, n_init=1,
+                                              batch_size=self.batch_size,
+                                              random_state=self.random_state)
+            else:
+                self._model = MiniBatchKMeans(n_clusters=num_clusters,
+                                              batch_size=self.batch_size,
+                                              random_state=self.random_state)
+            if self.streaming:
+                return self._stream_fit(matrix, num_clusters)
+            self._model.fit(matrix, sample_weight=self._sample_weight)
+        else:
+            raise Exception('Unknown clustering algorithm {}'.\
+                            format(self._algorithm))
+        return self._model.labels_
+    
+    def _initial_centroids(self, num_clusters):
+        '''
+        Map the centroids of init_model into the space of the documents: 
+        the weights of the terms shared by both vocabularies are kept, new 
+        terms start with zero weight. Return None if there is no 
+        init_model or it has a different number of clusters.
+        '''
+        if self.init_model is None or \
+           self.init_model.num_clusters != num_clusters:
+            return None
+        old_centroids = self.init_model.term_centroids()
+        old_vocabulary = self.init_model.vectorizer.vocabulary_
+        centroids = np.zeros((num_clusters, len(self._features)))
+        shared = [(i, old_vocabulary[term]) 
+                  for i, term in enumerate(self._features)
+                  if term in old_vocabulary]
+        if shared:
+            new_idx, old_idx = (list(idx) for idx in zip(*shared))
+            centroids[:, new_idx] = old_centroids[:, old_idx]
+        if self.n_components:
+            if self._svd is None:
+                return centroids
+            return self._svd.transform(centroids)
+        return centroids
+    
+    def _lsa(self, matrix, n_components):
+        '''
+        Reduce the tf-idf matrix to n_components dimensions with a truncated
+        SVD (latent semantic analysis) and normalize the rows of the 
+        reduced matrix. Return the fitted SVD, None if the matrix has too
+        few columns to be reduced, and the reduced matrix.
+        '''
+        n_components = min(n_components, matrix.shape[1] - 1)
+        if n_components < 1:
+            return None, normalize(matrix.toarray()).astype(matrix.dtype)
+        svd = TruncatedSVD(n_components=n_components, 
+                           random_state=self.random_state)
+        return svd, normalize(svd.fit_transform(matrix)).astype(matrix.dtype)
+    
+    def _stream_fit(self, matrix, num_clusters):
+        '''
+        Fit the mini batch k-means model with a single pass over the chunks 
+        of matrix and then label each chunk.
+        '''
+        num_docs = matrix.shape[0]
+        # the first chunk must have, at least, one document per cluster
+        chunk_size = max(self.batch_size, num_clusters)
+        for start in range(0, num_docs, chunk_size):
+            chunk = matrix[start:start+chunk_size]
+            chunk_weight = None
+            if self._sample_weight is not None:
+                chunk_weight = self._sample_weight[start:start+chunk_size]
+            if start > 0 or chunk.shape[0] >= num_clusters:
+                self._model.partial_fit(chunk, sample_weight=chunk_weight)
+        return np.concatenate([
+            self._model.predict(matrix[start:start+chunk_size]) 
+            for start in range(0, num_docs, chunk_size)
+        ])
+    
+    def export_model(self):
+        '''
+        Export the fitted vectorizer, LSA reduction and centroids of the 
+        clusters, so new documents can be assigned to the clusters later.
+        
+        Returns
+        -------
+        model : ClusteringModel
+        '''
+        if hasattr(self._model, 'cluster_centers_') and \
+           self._model.cluster_centers_.shape[0] == self._selected_num_clusters:
+            centroids = self._model.cluster_centers_
+        else:
+            centroids = cluster_centroids(self._document_matrix(), 
+                                          self._clusters,
+                                          self._selected_num_clusters,
+                                          self._sample_weight)
+        return ClusteringModel(self._vectorizer, self._svd, centroids,
+                               reduce=bool(self.n_components),
+                               language=self.language, 
+                               context_words=self.context_words,
+                               consider_urls=self.consider_urls)
     
     def top_terms_per_cluster(self, num_terms_per_cluster=3):
         '''
-        Compute the top 'n' terms per cluster.
+        Compute the top 'n' terms per cluster with the method set in the
+        top_terms_method parameter.
         
         Parameters
         ----------
@@ -164,31 +855,119 @@ class DocumentClustering:
         
         Returns
         -------
-        top_terms : Dictionary of clusters and their top 'n' terms
+        top_terms : Dictionary of clusters and their top 'n' terms with 
+        their scores
+        '''
+        if self.top_terms_method == 'pos':
+            return self._pos_top_terms(num_terms_per_cluster)
+        elif self.top_terms_method == 'tfidf':
+            return self._tfidf_top_terms(num_terms_per_cluster)
+        raise Exception('Unknown top terms method {}'.\
+                        format(self.top_terms_method))
+    
+    def _pos_top_terms(self, num_terms_per_cluster):
+        '''
+        Most common concepts of the documents of each cluster
         '''
         clusters_dic = {str(l): [] for l in set(self._clusters)}
-        top_terms = {k:[] for k in clusters_dic.keys()}
+        tagged_clusters_dic = {str(l): [] for l in set(self._clusters)}
+        weights_clusters_dic = {str(l): [] for l in set(self._clusters)}
         for i in range(0, len(self._clusters)):
             label = str(self._clusters[i])
             clusters_dic[label].append(self._docs[i])      
+            if self._tagged_docs is not None:
+                tagged_clusters_dic[label].append(self._tagged_docs[i])
+            if self._sample_weight is not None:
+                weights_clusters_dic[label].append(
+                                                self._sample_weight[i].item())
+        n_jobs = self.n_jobs
+        if n_jobs is None or n_jobs < 1:
+            n_jobs = cpu_count()
+        # clusters are processed in parallel, each one by a single process
+        parallel = n_jobs > 1 and len(clusters_dic) > 1
+        tasks = []
         for c,l in clusters_dic.items():
-            ce = ConceptExtractor(num_concepts=num_terms_per_cluster,
-                                  language=self.language, 
-                                  context_words=self.context_words)
-            ce.extract_concepts(l)
-            top_terms[c] = ce.common_concepts
+            doc_weights = None
+            if self._sample_weight is not None:
+                doc_weights = weights_clusters_dic[c]
+            tagged_docs = None
+            if self._tagged_docs is not None:
+                tagged_docs = tagged_clusters_dic[c]
+            tasks.append((l, tagged_docs, doc_weights, num_terms_per_cluster,
+                          self.language, self.context_words, 
+                          1 if parallel else self.n_jobs))
+        if parallel:
+            with Pool(processes=min(n_jobs, len(tasks))) as pool:
+                concepts = pool.map(_extract_cluster_concepts, tasks)
+        else:
+            concepts = [_extract_cluster_concepts(task) for task in tasks]
+        return dict(zip(clusters_dic.keys(), concepts))
+    
+    def _tfidf_top_terms(self, num_terms_per_cluster):
+        '''
+        Terms with the largest sum of tf-idf weights (times the weight of 
+        each document) in each cluster
+        '''
+        labels = np.asarray(self._clusters)
+        clusters, labels_idx = np.unique(labels, return_inverse=True)
+        num_docs = len(labels)
+        weights = np.ones(num_docs) if self._sample_weight is None \
+                  else self._sample_weight.astype(np.float64)
+        indicator = sp.csr_matrix((weights, (labels_idx, np.arange(num_docs))),
+                                  shape=(len(clusters), num_docs))
+        sums = sp.csr_matrix(indicator.dot(self._tfidf_matrix))
+        words = self._stem_words()
+        top_terms = {}
+        for i, c in enumerate(clusters):
+            row = sums.getrow(i)
+            top = np.argsort(-row.data, kind='mergesort')
+            top_terms[str(c)] = [
+                (' '.join(words.get(stem, stem) for stem in 
+                          self._features[row.indices[j]].split(' ')),
+                 float(row.data[j]))
+                for j in top[:num_terms_per_cluster]
+            ]
         return top_terms
+    
+    def _stem_words(self):
+        '''
+        Most frequent word of each stem in the documents
+        '''
+        if self._tokenized_docs is not None:
+            tokenized_docs = self._tokenized_docs
+        elif self._tagged_docs is not None:
+            tokenized_docs = [[token for token, tag in tagged_doc] 
+                              for tagged_doc in self._tagged_docs]
+        else:
+            tokenized_docs = tokenize_corpus(self._docs, 
+                                             language=self.language,
+                                             context_words=self.context_words,
+                                             remove_urls=not self.consider_urls,
+                                             n_jobs=self.n_jobs)
+        preprocessor = get_text_preprocessor(self.language, stem=True)
+        word_counts = Counter(token for tokens in tokenized_docs 
+                              for token in tokens)
+        words = {}
+        stem_counts = {}
+        for word, count in word_counts.items():
+            stem = preprocessor.stem_token(word)
+            if count > stem_counts.get(stem, 0):
+                words[stem] = word
+                stem_counts[stem] = count
+        return words
 
     def get_coordinate_vectors(self):
         '''
-        First, the function computes the cosine similarity of each document. 
-        Cosine similarity is measured against the tf-idf matrix and can be used 
-        to generate a measure of similarity between each document and the other 
-        documents in the corpus.
-        
-        Then, it converts the dist matrix into a 2-dimensional array of 
-        coordinate vectors.
+        Project the tf-idf matrix (or the LSA-reduced matrix if n_components
+        is set) into a 2-dimensional array of coordinate vectors using the 
+        method set in the projection parameter.
         
+        With MDS, the function first computes the cosine similarity of each 
+        document against the others, and then converts the distance matrix
+        into coordinates. As it needs memory quadratic in the number of 
+        documents, large collections are projected with landmark MDS (only 
+        the distances to a sample of documents are computed) or with a 
+        truncated SVD of the tf-idf matrix.
         
         Returns
         -------
@@ -196,13 +975,23 @@ class DocumentClustering:
         cluster and its x and y coordinate.
         '''
         
-        MDS()
-        dist = 1 - cosine_similarity(self._tfidf_matrix)
-        mds = MDS(n_components=2, dissimilarity="precomputed", random_state=1)
-        pos = mds.fit_transform(dist) # shape (n_components, n_samples)
+        # the coordinates don't depend on the clusters, so they are reused
+        # when a cached tree is cut again
+        if self._coordinates is None:
+            self._coordinates = project(self._document_matrix(), 
+                                        method=self.projection,
+                                        memory_budget=self.memory_budget,
+                                        random_state=self.random_state)
+            # the coordinates are few, and their values must be serializable
+            self._coordinates = self._coordinates.astype(np.float64)
+            if self._uses_cache():
+                self._write_cache_file('coordinates.npy', lambda f: np.save(
+                    f, self._coordinates
+                ))
+        pos = self._coordinates # shape (n_samples, 2)
         xs, ys = pos[:, 0], pos[:, 1]
-        # create a dictionary that has the result of the MDS plus the cluster 
-        # numbers and documents
+        # create a dictionary that has the result of the projection plus the
+        # cluster numbers and documents
         coor_vecs = dict(x=xs, y=ys, label=self._clusters, docs=self._docs)
         return coor_vecs
     
@@ -214,9 +1003,64 @@ class DocumentClustering:
     def features(self):
         return self._features
     
+    @property
+    def vectorizer(self):
+        return self._vectorizer
+    
+    @property
+    def reduced_matrix(self):
+        return self._reduced_matrix
+    
+    @property
+    def labels(self):
+        return self._clusters
+    
     @property
     def num_docs_per_cluster(self):
         return self._num_docs_per_clusters
+    
+    @property
+    def selected_num_clusters(self):
+        '''
+        Number of clusters of the clustering: num_clusters, or the selected
+        one if num_clusters is 'auto'
+        '''
+        return self._selected_num_clusters
+    
+    @property
+    def k_scores(self):
+        '''
+        Score of each number of clusters tried when num_clusters is 'auto'
+        '''
+        return self._k_scores
+    
+    @property
+    def silhouette_score(self):
+        return self._silhouette_score
+    
+    @property
+    def calinski_harabaz_score(self):
+        return self._calinski_harabaz_score
+
+# IterativeDocumentClustering whose sub clusterings are run by the workers
+_iterative_clustering = None
+
+
+def _init_subset_worker(iterative_clustering):
+    global _iterative_clustering
+    _iterative_clustering = iterative_clustering
+
+
+def _cluster_subset(args):
+    '''
+    Re-cluster an oversized cluster. Run by the worker processes of 
+    IterativeDocumentClustering.
+    '''
+    rows, num_clusters = args
+    result, top_terms, _ = _iterative_clustering.cluster_subset(rows, 
+                                                                num_clusters)
+    return result, top_terms
+
 
 class IterativeDocumentClustering:
     '''
@@ -267,12 +1111,17 @@ class IterativeDocumentClustering:
     
     num_temrs: integer, 3 by default
         Number of top terms per cluster
+    
+    n_jobs: int, 1 by default
+        Number of processes used to tokenize the documents and to re 
+        cluster the oversized clusters of each level. If -1, all the CPUs 
+        are used.
     '''
     
     def __init__(self, num_clusters=5, context_words=[], ngram_range=(1,1), 
                 min_df=0.05, max_df=0.9, consider_urls=False, 
                 language='english', threshold=0.6, n_sub_clusters=3,
-                num_terms=6, use_idf=False):
+                num_terms=6, use_idf=False, n_jobs=1):
         self.num_clusters = num_clusters
         self.context_words = context_words
         self.ngram_range = ngram_range
@@ -284,34 +1133,37 @@ class IterativeDocumentClustering:
         self.n_sub_clusters = n_sub_clusters
         self.num_terms = num_terms
         self.use_idf = use_idf
+        self.n_jobs = n_jobs
+        self._docs = None
+        self._stemmed_docs = None
+        self._tagged_docs = None
         self._clusters_data = {}
+        self._top_terms = {}
+        self._level_times = []
 
-    def cluster_subset(self, docs, coords=None, num_clusters=5):
+    def cluster_subset(self, rows, num_clusters=5):
         '''
-        Cluster a set of docs into num_clusters groups
+        Cluster a subset of the docs into num_clusters groups. The stems and
+        part-of-speech tags computed once for the whole collection are 
+        reused, only the tf-idf vocabulary is fitted again on the subset.
 
         Parameters
         ----------
-        docs: iterable
-            An iterable which yields a list of strings
-        
-        coords: iterable
-            An iterable which yields a list of tuple of (x,y) form where x
-            and y represent bidimensional coordinates of each doc.
-            If None, it uses the get_coordinate_vectors method of the
-            DocumentClustering class to calculate new coordinates.
+        rows: list
+            The positions of the docs of the subset in the collection.
 
         num_clusters: int, 5 by default
             The number of clusters in which the documents will be grouped.
 
         Returns
         -------
-        result: dictionary where keys are clusters labels and values are list
-        of the form (t,x,y) where t is the text of a document, and x & y are
-        the coordinates of the document.
+        result: dictionary where keys are clusters labels and values are the
+        positions of the docs of each cluster.
 
         top_terms: dictionary where keys are clusters labels and values are
         strings that have the top termns per clusters.
+
+        dc: the fitted DocumentClustering
         '''
 
         dc = DocumentClustering(num_clusters=num_clusters,
@@ -319,67 +1171,114 @@ class IterativeDocumentClustering:
                                 ngram_range=self.ngram_range,
                                 min_df=self.min_df,
                                 max_df=self.max_df,
-                                use_idf=self.use_idf)
-        dc.clustering(docs)
-        vec = dc.get_coordinate_vectors()
-        if coords != None:
-            xs = [c[0] for c in coords]
-            ys = [c[1] for c in coords]
-        else:
-            xs = vec["x"]
-            ys = vec["y"]
-        labels = vec["label"]
-        texts = vec["docs"]
-        result = {str(l): [] for l in set(labels)}
-        for i in range(0, len(labels)):
-            cluster = str(labels[i])
-            data = (texts[i], xs[i], ys[i])
-            result[cluster].append(data)
+                                consider_urls=self.consider_urls,
+                                language=self.language,
+                                use_idf=self.use_idf,
+                                compute_metrics=False)
+        dc.clustering([self._docs[i] for i in rows], 
+                      [self._stemmed_docs[i] for i in rows],
+                      [self._tagged_docs[i] for i in rows])
+        result = {str(l): [] for l in set(dc.labels)}
+        for row, label in zip(rows, dc.labels):
+            result[str(label)].append(row)
 
         top_terms = {str(c): tt for c,tt in dc.top_terms_per_cluster\
                                              (self.num_terms).items()}
-        return result, top_terms
+        return result, top_terms, dc
 
-    def clustering(self, docs):
+    def clustering(self, docs, stemmed_docs=None, tagged_docs=None):
         '''
         Call cluster_subset method iteratively until all groups are small 
-        enough.
+        enough. Documents are tokenized only once, and their coordinates 
+        are computed only for the first clustering, as sub clusters keep 
+        the coordinates of their documents.
 
         Parameters
         ----------
         docs: iterable
             An iterable which yields a list of strings
+
+        stemmed_docs: list, None by default
+            The stems of each document joined by spaces, if they were 
+            already computed.
+
+        tagged_docs: list, None by default
+            The (token, part-of-speech tag) tuples of each document, if they
+            were already computed.
         '''
+        self._docs = list(docs)
+        if stemmed_docs is None:
+            stemmed_docs = tokenize_corpus(self._docs, language=self.language,
+                                           stem=True, 
+                                           context_words=self.context_words,
+                                           join_words=True,
+                                           remove_urls=not self.consider_urls,
+                                           n_jobs=self.n_jobs)
+        if tagged_docs is None:
+            tokenized_docs = tokenize_corpus(self._docs, 
+                                             language=self.language,
+                                             context_words=self.context_words,
+                                             remove_urls=not self.consider_urls,
+                                             n_jobs=self.n_jobs)
+            tagged_docs = pos_tag_corpus(tokenized_docs)
+        self._stemmed_docs = stemmed_docs
+        self._tagged_docs = tagged_docs
         top_terms = {}
-        limit =  int(self.threshold*len(docs))
+        limit =  int(self.threshold*len(self._docs))
+        self._level_times = []
+        start = time.time()
         #first time cluster_subset is called with the num_clusters attribute
-        result, top_terms = self.cluster_subset(docs=docs,
-                                                num_clusters=self.num_clusters)
-        while True:
-            n_docs = {c: len(l) for c,l in result.items()}
-            re_cluster = [c for c,n in n_docs.items() if n > limit]
-            if len(re_cluster) == 0:
-                break
-            # re_cluster contains the labels of groups that are over the limit
-            for rc in re_cluster:
-                # remove big cluster from final result
-                rc_data = result.pop(rc)
-                rc_docs = [t for (t,x,y) in rc_data]
-                saved_coords = [(x,y) for (t,x,y) in rc_data]
-                # cluster_subset is called with the n_sub_clusters attribute
-                # when re-clustering
-                new_res, new_terms = self.cluster_subset(docs=rc_docs, 
-                                             coords=saved_coords,
-                                             num_clusters=self.n_sub_clusters)
-                # add new clusters to final result
-                for nc,l in new_res.items():
-                    result[rc+"."+nc] = l
-                # remove top terms of big clusters
-                top_terms.pop(rc)
-                # add new clusters' top terms
-                for nc,tt in new_terms.items():
-                    top_terms[rc+"."+nc] = tt
-        self._clusters_data = result
+        result, top_terms, dc = self.cluster_subset(
+                                    rows=list(range(len(self._docs))),
+                                    num_clusters=self.num_clusters)
+        vec = dc.get_coordinate_vectors()
+        xs = vec["x"]
+        ys = vec["y"]
+        self._level_times.append(time.time() - start)
+        n_jobs = self.n_jobs
+        if n_jobs is None or n_jobs < 1:
+            n_jobs = cpu_count()
+        pool = None
+        try:
+            while True:
+                n_docs = {c: len(l) for c,l in result.items()}
+                re_cluster = [c for c,n in n_docs.items() if n > limit]
+                if len(re_cluster) == 0:
+                    break
+                start = time.time()
+                # re_cluster contains the labels of groups that are over the 
+                # limit. The groups are independent, so they are re clustered
+                # concurrently. cluster_subset is called with the 
+                # n_sub_clusters attribute when re-clustering
+                tasks = [(result.pop(rc), self.n_sub_clusters) 
+                         for rc in re_cluster]
+                if n_jobs == 1 or len(tasks) == 1:
+                    sub_results = [self.cluster_subset(*task)[:2] 
+                                   for task in tasks]
+                else:
+                    if pool is None:
+                        # workers get the tokenized docs only once
+                        pool = Pool(processes=n_jobs, 
+                                    initializer=_init_subset_worker,
+                                    initargs=(self,))
+                    sub_results = pool.map(_cluster_subset, tasks)
+                for rc, (new_res, new_terms) in zip(re_cluster, sub_results):
+                    # add new clusters to final result
+                    for nc,l in new_res.items():
+                        result[rc+"."+nc] = l
+                    # remove top terms of big clusters
+                    top_terms.pop(rc)
+                    # add new clusters' top terms
+                    for nc,tt in new_terms.items():
+                        top_terms[rc+"."+nc] = tt
+                self._level_times.append(time.time() - start)
+        finally:
+            if pool is not None:
+                pool.terminate()
+        self._clusters_data = {
+            c: [(self._docs[i], xs[i], ys[i]) for i in rows]
+            for c, rows in result.items()
+        }
         self._top_terms = top_terms
     
     @property
@@ -389,5 +1288,11 @@ class IterativeDocumentClustering:
     @property
     def top_terms_per_cluster(self):
         return self._top_terms
-    
-    
\ No newline at end of file
+
+    @property
+    def level_times(self):
+        '''
+        Wall time, in seconds, of each level of clustering. The first level 
+        includes the projection of the documents.
+        '''
+        return self._level_times
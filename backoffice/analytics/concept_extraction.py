@@ -7,9 +7,8 @@ Created on Sat Oct 14 17:07:11 2017
 """
 
 import pandas as pd
-import nltk
-import re
-from analytics.utils import tokenize_and_remove_stop_words, download_stop_words
+from analytics.utils import tokenize_corpus, pos_tag_corpus
+from analytics.ngrams import NgramCounter
 
 
 class ConceptExtractor():
@@ -29,7 +28,7 @@ class ConceptExtractor():
     ngram_range: tuple, (1,1) by default
         The lower and upper boundary of the range of n-values for different 
         n-grams to be extracted. All values of n such that 
-        min_n <= n <= max_n will be used.
+        min_n <= n <= max_n will be used. min_n must be 1.
     
     pos_vec: list, only words tagged as nouns (i.e., ['NN', 'NNP']) are 
     considered by default
@@ -44,27 +43,35 @@ class ConceptExtractor():
     language: string, english by default
         Language of the documents. Only the languages supported by the
         library NLTK are supported.
+    
+    n_jobs: int, 1 by default
+        Number of processes used to tokenize the documents. If -1, all the 
+        CPUs are used.
+    
+    context_free_tagging: boolean, False by default
+        Whether each distinct word should be tagged only once, regardless
+        of the words around it. Faster, but less accurate.
     '''
-    _reg_exp_urls = r'^https?:\/\/.*[\r\n]*'
     
     def __init__(self, num_concepts=5, context_words=[], 
                  ngram_range=(1,1), pos_vec=['NN', 'NNP'], 
-                 consider_urls=False, language='english'):
+                 consider_urls=False, language='english', n_jobs=1,
+                 context_free_tagging=False):
         self.num_concepts = num_concepts
         self.context_words = context_words
         self.ngram_range = ngram_range
         self.pos_vec = pos_vec
         self.consider_urls = consider_urls
         self.language = language
+        self.n_jobs = n_jobs
+        self.context_free_tagging = context_free_tagging
         # properties
         self._docs = None
         self._number_words = 0
         self._unique_words = 0
         self._common_concepts = []
-        # download stop words in case they weren't already downloaded
-        download_stop_words()
     
-    def extract_concepts(self, docs):
+    def extract_concepts(self, docs, tagged_docs=None, doc_weights=None):
         '''
         Extract the most common concepts in the collection of 
         documents.
@@ -74,76 +81,70 @@ class ConceptExtractor():
         docs: iterable
             An iterable which yields a list of strings
         
+        tagged_docs: list, None by default
+            The (token, part-of-speech tag) tuples of each document, if they
+            were already computed. If None, documents are tokenized and
+            tagged.
+        
+        doc_weights: list, None by default
+            Number of times each document counts, e.g., the size of the 
+            group of near-duplicates represented by each document. The 
+            n-grams are counted with the weight of the document in which 
+            they start.
+        
         Returns
         -------
         self : ConceptExtractor
         
         '''        
         self._docs = docs
-        # tokenize documents
-        tokenized_docs = []
-        for doc in self._docs:
-            if not self.consider_urls:
-                doc = re.sub(self._reg_exp_urls, '', doc, 
-                              flags=re.MULTILINE)
-            tokenized_doc = tokenize_and_remove_stop_words(doc, 
-                                                           self.context_words,
-                                                           language=self.language)
-            tokenized_docs.append(tokenized_doc)
+        if tagged_docs is None:
+            # tokenize documents
+            tokenized_docs = tokenize_corpus(self._docs, 
+                                             language=self.language,
+                                             context_words=self.context_words,
+                                             remove_urls=not self.consider_urls,
+                                             n_jobs=self.n_jobs)
+            tagged_docs = pos_tag_corpus(tokenized_docs, 
+                                         self.context_free_tagging)
             
         # consider only the part-of-speech (pos) required
-        tagged_senteces = [nltk.pos_tag(token) for token in tokenized_docs]
-        pos_tokens = [tagged_token for tagged_sentence in tagged_senteces 
+        pos_tokens = [tagged_token for tagged_sentence in tagged_docs 
                       for tagged_token in tagged_sentence if tagged_token[1] 
                       in self.pos_vec]
         tokens = [pos_token[0] for pos_token in pos_tokens]
-        
-        # compute most frequent words
-        fdist = nltk.FreqDist(tokens)
-        common_words = fdist.most_common(self.num_concepts)
-        self._unique_words = fdist.keys()
-        self._number_words = sum([i[1] for i in fdist.items()])
-        
-        # compute most frequent n-grams
+        token_weights = None
+        if doc_weights is not None:
+            token_weights = [weight for tagged_sentence, weight 
+                             in zip(tagged_docs, doc_weights)
+                             for tagged_token in tagged_sentence 
+                             if tagged_token[1] in self.pos_vec]
         min_n, max_n = self.ngram_range
-        common_bigrams = []
-        common_trigrams = []
-        if min_n == 1:
-            if max_n == 1:
-                self._common_concepts = common_words[:self.num_concepts]
-                return self
-            else:
-                if max_n <= 3:
-                    for i in range(min_n, max_n):
-                        if i==1:
-                            bgs = nltk.bigrams(tokens)
-                            fdist = nltk.FreqDist(bgs)
-                            common_bigrams = fdist.most_common(self.num_concepts)
-                        else:
-                            bgs = nltk.trigrams(tokens)
-                            fdist = nltk.FreqDist(bgs)
-                            common_trigrams = fdist.most_common(self.num_concepts)
-                else:
-                    raise Exception('The max number in the n-gram range \
-                                    cannot be larger than 3')
-        else:
+        if min_n != 1:
             raise Exception('The minimun number in the n-gram range \
                             must be equal to 1')
         
+        # count the n-grams of every length at once
+        counter = NgramCounter(max_n).count(tokens, token_weights)
+        
+        # compute most frequent words
+        common_words = counter.most_common(1, self.num_concepts)
+        self._unique_words = counter.words
+        self._number_words = counter.total(1)
+        if max_n == 1:
+            self._common_concepts = common_words[:self.num_concepts]
+            return self
+        
         # make list of common concepts considering n-grams
         least_freq_common_word = common_words[-1][1]
         ngrams_to_consider = []
-        # save relevant ngrams        
-        for bigram in common_bigrams:
-            if bigram[1] > least_freq_common_word:
-                ngrams_to_consider.append(bigram)
-            else:
-                break
-        for trigram in common_trigrams:
-            if trigram[1] > least_freq_common_word:
-                ngrams_to_consider.append(trigram)
-            else:
-                break
+        # save relevant ngrams, from the shortest to the longest
+        for n in range(2, max_n + 1):
+            for ngram in counter.most_common(n, self.num_concepts):
+                if ngram[1] > least_freq_common_word:
+                    ngrams_to_consider.append(ngram)
+                else:
+                    break
         # delete word of the ngrams from the list of common words to avoid 
         # duplicates
         idx_elements_to_remove = []
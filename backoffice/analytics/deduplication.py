@@ -0,0 +1,194 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Detection of near-duplicate documents (e.g., copy-pasted ideas of a
+campaign) with MinHash signatures and locality-sensitive hashing (LSH).
+
+Each document is represented by the set of its shingles (sequences of
+consecutive tokens) and summarized by a MinHash signature, whose fraction of
+equal values estimates the Jaccard similarity of two documents. Signatures
+are split into bands and only documents that share all the values of a band
+are compared, so near-duplicates are found in time roughly linear in the
+number of documents.
+"""
+
+import zlib
+from collections import defaultdict
+import numpy as np
+from analytics.utils import tokenize_corpus
+
+
+# Prime modulus of the hash functions of the MinHash signatures
+MERSENNE_PRIME = (1 << 31) - 1
+
+
+class DuplicateDetector:
+    '''
+    Group near-duplicate documents.
+
+    Parameters
+    ----------
+    threshold: float, 0.8 by default
+        Minimum estimated Jaccard similarity between the shingles of two
+        documents to consider them duplicates.
+
+    num_perm: int, 128 by default
+        Number of hash functions of the MinHash signatures.
+
+    num_bands: int, 16 by default
+        Number of bands in which signatures are split. Documents sharing a
+        band are compared. More bands find more pairs with low similarity,
+        at the cost of more comparisons.
+
+    shingle_size: int, 3 by default
+        Number of consecutive tokens of each shingle.
+
+    context_words : list, empty list by default
+        List of context-specific words that should notbe considered in the
+        analysis.
+
+    consider_urls: boolean, False by default
+        Whether URLs should be removed or not.
+
+    language: string, english by default
+        Language of the documents. Only the languages supported by the
+        library NLTK are supported.
+
+    n_jobs: int, 1 by default
+        Number of processes used to tokenize the documents. If -1, all the
+        CPUs are used.
+
+    random_state: int, 1 by default
+        Seed used to generate the hash functions.
+    '''
+
+    def __init__(self, threshold=0.8, num_perm=128, num_bands=16,
+                 shingle_size=3, context_words=[], consider_urls=False,
+                 language='english', n_jobs=1, random_state=1):
+        self.threshold = threshold
+        self.num_perm = num_perm
+        self.num_bands = num_bands
+        self.shingle_size = shingle_size
+        self.context_words = context_words
+        self.consider_urls = consider_urls
+        self.language = language
+        self.n_jobs = n_jobs
+        self.random_state = random_state
+        rng = np.random.RandomState(random_state)
+        self._a = rng.randint(1, MERSENNE_PRIME, num_perm).astype(np.uint64)
+        self._b = rng.randint(0, MERSENNE_PRIME, num_perm).astype(np.uint64)
+        # properties
+        self._labels = []
+        self._representatives = []
+        self._weights = []
+
+    def _shingles(self, tokens):
+        size = min(self.shingle_size, len(tokens))
+        return {zlib.crc32(' '.join(tokens[i:i+size]).encode('utf-8')) \
+                % MERSENNE_PRIME for i in range(len(tokens) - size + 1)}
+
+    def _signature(self, shingles):
+        hashes = np.fromiter(shingles, dtype=np.uint64, count=len(shingles))
+        return ((np.outer(self._a, hashes) + self._b[:, np.newaxis]) %
+                MERSENNE_PRIME).min(axis=1)
+
+    def fit(self, docs, tokenized_docs=None):
+        '''
+        Find the groups of near-duplicate documents.
+
+        Parameters
+        ----------
+        docs: iterable
+            An iterable which yields a list of strings
+
+        tokenized_docs: list, None by default
+            The tokens of each document, if they were already computed. If
+            None, documents are tokenized.
+
+        Returns
+        -------
+        self : DuplicateDetector
+        '''
+        if tokenized_docs is None:
+            tokenized_docs = tokenize_corpus(docs, language=self.language,
+                                             context_words=self.context_words,
+                                             remove_urls=not self.consider_urls,
+                                             n_jobs=self.n_jobs)
+        num_docs = len(tokenized_docs)
+        rows = self.num_perm // self.num_bands
+        signatures = {}
+        for i, tokens in enumerate(tokenized_docs):
+            # documents without tokens are never considered duplicates
+            if tokens:
+                signatures[i] = self._signature(self._shingles(tokens))
+        parents = list(range(num_docs))
+
+        def find(i):
+            while parents[i] != i:
+                parents[i] = parents[parents[i]]
+                i = parents[i]
+            return i
+
+        for band in range(self.num_bands):
+            buckets = defaultdict(list)
+            for i, signature in signatures.items():
+                key = signature[band*rows:(band+1)*rows].tobytes()
+                buckets[key].append(i)
+            for members in buckets.values():
+                # each member is compared with the first similar member of
+                # the bucket, if any
+                bucket_reps = [members[0]]
+                for i in members[1:]:
+                    for rep in bucket_reps:
+                        similarity = np.mean(signatures[i] == signatures[rep])
+                        if similarity >= self.threshold:
+                            parents[find(i)] = find(rep)
+                            break
+                    else:
+                        bucket_reps.append(i)
+        # groups are numbered by their first document, which represents them
+        group_ids = {}
+        self._labels = []
+        self._representatives = []
+        self._weights = []
+        for i in range(num_docs):
+            root = find(i)
+            if root not in group_ids:
+                group_ids[root] = len(self._representatives)
+                self._representatives.append(i)
+                self._weights.append(0)
+            self._labels.append(group_ids[root])
+            self._weights[group_ids[root]] += 1
+        return self
+
+    def expand(self, values):
+        '''
+        Map a list with a value per group (e.g., the results of analyzing the
+        representatives) to a list with a value per document.
+        '''
+        return [values[label] for label in self._labels]
+
+    @property
+    def labels(self):
+        '''
+        Group of each document
+        '''
+        return self._labels
+
+    @property
+    def representatives(self):
+        '''
+        Position of the document that represents each group
+        '''
+        return self._representatives
+
+    @property
+    def weights(self):
+        '''
+        Number of documents of each group
+        '''
+        return self._weights
+
+    @property
+    def num_duplicates(self):
+        return len(self._labels) - len(self._representatives)
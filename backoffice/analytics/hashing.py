@@ -0,0 +1,186 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Tf-idf vectorization with a fixed number of features for collections whose
+vocabulary doesn't fit in memory.
+
+Terms are mapped to columns with the hashing trick, so no vocabulary is
+kept. Document frequencies are accumulated while the documents are
+streamed in chunks, and a side table keeps the most frequent term of each
+column (found with the Misra-Gries algorithm over the counts of each
+chunk) so columns can be shown as readable terms.
+"""
+
+from collections import Counter
+import numpy as np
+import scipy.sparse as sp
+from sklearn.feature_extraction.text import HashingVectorizer
+from sklearn.preprocessing import normalize
+from sklearn.utils import murmurhash3_32
+
+
+# Number of columns of the hashed matrices
+N_FEATURES = 2 ** 20
+
+# Number of documents vectorized at a time
+CHUNK_SIZE = 10000
+
+
+def bucket(term, n_features):
+    '''
+    Column of a term in a hashed matrix of n_features columns (the same 
+    mapping as sklearn's FeatureHasher)
+    '''
+    return abs(murmurhash3_32(term, seed=0)) % n_features
+
+
+class BucketTerms:
+    '''
+    Most frequent term of each bucket of a hashed matrix, found with the 
+    Misra-Gries algorithm with a single counter per bucket. Memory is 
+    bounded by the number of buckets, whatever the number of documents.
+    '''
+
+    def __init__(self, n_features):
+        self.n_features = n_features
+        self._candidates = {}
+        self._counts = {}
+
+    def update(self, term_counts, key=None):
+        '''
+        Update the summary with a dictionary of term counts. If key is 
+        given, each term is counted in the bucket of key(term) (e.g., the 
+        words of the bucket of their stem)
+        '''
+        for term, count in term_counts.items():
+            b = bucket(term if key is None else key(term), self.n_features)
+            candidate_count = self._counts.get(b, 0)
+            if self._candidates.get(b) == term:
+                self._counts[b] = candidate_count + count
+            elif count > candidate_count:
+                self._candidates[b] = term
+                self._counts[b] = count - candidate_count
+            else:
+                self._counts[b] = candidate_count - count
+
+    def term(self, b, default=None):
+        return self._candidates.get(b, str(b) if default is None else default)
+
+
+class HashingTfidfVectorizer:
+    '''
+    Convert documents to a tf-idf matrix whose columns are hashed terms.
+    It follows the interface of sklearn's TfidfVectorizer (smoothed idf
+    and l2-normalized rows).
+
+    Parameters
+    ----------
+    n_features: int, N_FEATURES by default
+        Number of hash buckets. Collisions are rare if it is much larger
+        than the number of distinct terms.
+
+    ngram_range: tuple, (1,1) by default
+        The lower and upper boundary of the range of n-values for different
+        n-grams to be extracted.
+
+    min_df: float in range [0.0, 1.0] or int, default=1
+        Columns whose document frequency is lower are discarded. A float
+        is interpreted as a percentage of the documents.
+
+    max_df: float in range [0.0, 1.0] or int, default=1.0
+        Columns whose document frequency is higher are discarded. A float
+        is interpreted as a percentage of the documents.
+
+    use_idf: boolean, True by default
+        Whether the term frequencies should be weighted by the inverse
+        document frequency.
+
+    chunk_size: int, CHUNK_SIZE by default
+        Number of documents vectorized at a time.
+
+    dtype: type, np.float64 by default
+        Type of the values of the matrix.
+    '''
+
+    def __init__(self, n_features=N_FEATURES, ngram_range=(1,1), min_df=1,
+                 max_df=1.0, use_idf=True, chunk_size=CHUNK_SIZE,
+                 dtype=np.float64):
+        self.n_features = n_features
+        self.ngram_range = ngram_range
+        self.min_df = min_df
+        self.max_df = max_df
+        self.use_idf = use_idf
+        self.chunk_size = chunk_size
+        self.dtype = dtype
+        self._hasher = HashingVectorizer(n_features=n_features,
+                                         ngram_range=ngram_range,
+                                         alternate_sign=False, norm=None,
+                                         dtype=dtype)
+        # properties
+        self.columns_ = None
+        self.idf_ = None
+        self.vocabulary_ = {}
+        self._features = []
+
+    def _bounds(self, num_docs):
+        min_df = self.min_df if isinstance(self.min_df, int) \
+                 else self.min_df * num_docs
+        max_df = self.max_df if isinstance(self.max_df, int) \
+                 else self.max_df * num_docs
+        return min_df, max_df
+
+    def _weight(self, counts):
+        matrix = counts[:, self.columns_]
+        if self.use_idf:
+            matrix = matrix.dot(sp.diags(self.idf_))
+        return normalize(matrix).astype(self.dtype)
+
+    def fit_transform(self, docs):
+        '''
+        Learn the document frequencies and the term of each column, and
+        return the tf-idf matrix of docs.
+        '''
+        analyzer = self._hasher.build_analyzer()
+        doc_freqs = np.zeros(self.n_features, dtype=np.int64)
+        bucket_terms = BucketTerms(self.n_features)
+        chunks = []
+        num_docs = 0
+        for start in range(0, len(docs), self.chunk_size):
+            chunk_docs = docs[start:start+self.chunk_size]
+            counts = self._hasher.transform(chunk_docs).tocsc()
+            doc_freqs += np.diff(counts.indptr)
+            chunks.append(counts.tocsr())
+            num_docs += len(chunk_docs)
+            bucket_terms.update(Counter(term for doc in chunk_docs
+                                        for term in analyzer(doc)))
+        if not chunks:
+            raise ValueError('empty vocabulary; perhaps the documents only '
+                             'contain stop words')
+        min_df, max_df = self._bounds(num_docs)
+        keep = (doc_freqs > 0) & (doc_freqs >= min_df) & (doc_freqs <= max_df)
+        if not keep.any():
+            raise ValueError('After pruning, no terms remain. Try a lower '
+                             'min_df or a higher max_df.')
+        self.columns_ = np.flatnonzero(keep).astype(np.int32)
+        self.idf_ = np.log((1. + num_docs) /
+                           (1. + doc_freqs[self.columns_])) + 1.
+        self._features = [bucket_terms.term(b) for b in self.columns_]
+        self.vocabulary_ = {term: i for i, term in enumerate(self._features)}
+        return self._weight(sp.vstack(chunks, format='csr'))
+
+    def fit(self, docs):
+        self.fit_transform(docs)
+        return self
+
+    def transform(self, docs):
+        '''
+        Return the tf-idf matrix of docs using the learned columns and
+        document frequencies.
+        '''
+        return self._weight(self._hasher.transform(docs))
+
+    def get_feature_names(self):
+        '''
+        Most frequent term of each column
+        '''
+        return self._features
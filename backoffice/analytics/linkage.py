@@ -0,0 +1,67 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import numpy as np
+
+
+class LinkageTree:
+    '''
+    Full merge tree of a hierarchical clustering. Once built, the tree can
+    be cut at any number of clusters without clustering the documents
+    again.
+
+    Parameters
+    ----------
+    children : array of shape (n_leaves - 1, 2)
+        The children of each non-leaf node, as in the children_ attribute
+        of sklearn's AgglomerativeClustering. Node n_leaves + i is created
+        by the i-th merge.
+
+    n_leaves : int
+        The number of leaves (i.e., documents) of the tree.
+    '''
+
+    def __init__(self, children, n_leaves):
+        self.children = np.asarray(children, dtype=np.int64)
+        self.n_leaves = int(n_leaves)
+
+    @classmethod
+    def from_model(cls, model):
+        '''
+        Build the tree of a fitted AgglomerativeClustering model. The model
+        must have been fitted with compute_full_tree=True.
+        '''
+        return cls(model.children_, model.n_leaves_)
+
+    @classmethod
+    def load(cls, path):
+        data = np.load(path)
+        return cls(data['children'], data['n_leaves'])
+
+    def save(self, path):
+        np.savez(path, children=self.children, n_leaves=self.n_leaves)
+
+    def cut(self, n_clusters):
+        '''
+        Cut the tree undoing its last n_clusters - 1 merges.
+
+        Returns
+        -------
+        labels : array with the cluster of each leaf
+        '''
+        n_leaves = self.n_leaves
+        n_clusters = max(1, min(n_clusters, n_leaves))
+        num_merges = n_leaves - n_clusters
+        # nodes created by the merges that are kept
+        threshold = n_leaves + num_merges
+        if n_clusters == 1:
+            roots = [2 * n_leaves - 2] if n_leaves > 1 else [0]
+        else:
+            undone = self.children[num_merges:].ravel()
+            roots = np.sort(undone[undone < threshold])
+        node_labels = np.zeros(threshold, dtype=np.int64)
+        node_labels[roots] = np.arange(len(roots))
+        # propagate the labels from the roots down to the leaves
+        for i in range(num_merges - 1, -1, -1):
+            node_labels[self.children[i]] = node_labels[n_leaves + i]
+        return node_labels[:n_leaves]
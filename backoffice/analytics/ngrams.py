@@ -0,0 +1,138 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Counting of the n-grams of long sequences of tokens.
+
+Tokens are mapped once to integer ids, and the n-grams of every length up
+to max_n are counted with NumPy over arrays of ids. The ids of each n-gram
+are packed into a single 64-bit integer key when they fit (otherwise the
+rows of ids are compared), so no tuple or string is built per n-gram. The
+ids, counts and first occurrences of the distinct n-grams are kept in
+arrays, and only the n-grams that are returned are converted back to
+tokens.
+"""
+
+import numpy as np
+
+
+class NgramCounter:
+    '''
+    Count the n-grams of a sequence of tokens, for every n from 1 to max_n.
+
+    Counts and ties follow nltk.FreqDist: the top n-grams are the ones that
+    most_common() of a FreqDist of the same n-grams would return, with the
+    n-grams of equal count ordered by their first occurrence.
+
+    Parameters
+    ----------
+    max_n: int, 1 by default
+        The length of the longest n-grams counted.
+    '''
+
+    def __init__(self, max_n=1):
+        self.max_n = max_n
+        # properties
+        self._words = []
+        self._ids = None
+        self._ngrams = {}
+
+    def _keys(self, ids, n, bits):
+        '''
+        Key of each n-gram of ids, n consecutive ids packed in an integer
+        or, if they don't fit in 64 bits, a row of n ids
+        '''
+        num_ngrams = len(ids) - n + 1
+        if n * bits <= 63:
+            keys = ids[:num_ngrams].copy()
+            for j in range(1, n):
+                keys = (keys << bits) | ids[j:j+num_ngrams]
+            return keys
+        return np.stack([ids[j:j+num_ngrams] for j in range(n)], axis=1)
+
+    def count(self, tokens, weights=None):
+        '''
+        Count the n-grams of tokens.
+
+        Parameters
+        ----------
+        tokens: list
+            The sequence of tokens
+
+        weights: list, None by default
+            Number of times each token counts. Each n-gram is counted with
+            the weight of its first token.
+
+        Returns
+        -------
+        self : NgramCounter
+        '''
+        vocabulary = {}
+        ids = np.fromiter((vocabulary.setdefault(token, len(vocabulary))
+                           for token in tokens), dtype=np.int64,
+                          count=len(tokens))
+        self._words = list(vocabulary)
+        self._ids = ids
+        if weights is not None:
+            weights = np.asarray(weights)
+        bits = max(1, (len(vocabulary) - 1).bit_length())
+        self._ngrams = {}
+        for n in range(1, self.max_n + 1):
+            if len(ids) < n:
+                self._ngrams[n] = (np.zeros(0, dtype=np.int64),
+                                   np.zeros(0, dtype=np.int64))
+                continue
+            keys = self._keys(ids, n, bits)
+            _, first, inverse = np.unique(keys, return_index=True,
+                                          return_inverse=True, axis=0)
+            inverse = inverse.ravel()
+            if weights is None:
+                counts = np.bincount(inverse)
+            else:
+                counts = np.zeros(len(first), dtype=weights.dtype)
+                np.add.at(counts, inverse, weights[:len(inverse)])
+            # each n-gram is found in the ids from its first occurrence
+            self._ngrams[n] = (counts, first)
+        return self
+
+    def _ngram(self, start, n):
+        ids = self._ids[start:start+n].tolist()
+        if n == 1:
+            return self._words[ids[0]]
+        return tuple(self._words[i] for i in ids)
+
+    def most_common(self, n=1, num_ngrams=None):
+        '''
+        The num_ngrams most common n-grams of length n (all of them if
+        num_ngrams is None). The candidates are selected with a partial
+        sort of the counts, and only they are sorted.
+
+        Returns
+        -------
+        A list of (n-gram, count) tuples, sorted by decreasing count. Each
+        n-gram is a token if n is 1 and a tuple of n tokens otherwise.
+        '''
+        counts, first = self._ngrams[n]
+        candidates = np.arange(len(counts))
+        if num_ngrams is not None and num_ngrams < len(counts):
+            if num_ngrams <= 0:
+                return []
+            top = np.argpartition(-counts, num_ngrams - 1)[:num_ngrams]
+            # the n-grams tied with the last of the top ones are candidates
+            # too, since ties are broken by first occurrence
+            candidates = np.flatnonzero(counts >= counts[top].min())
+        order = np.lexsort((first[candidates], -counts[candidates]))
+        top = candidates[order[:num_ngrams]]
+        return [(self._ngram(first[i], n), counts[i].item()) for i in top]
+
+    def total(self, n=1):
+        '''
+        Sum of the counts of the n-grams of length n
+        '''
+        return self._ngrams[n][0].sum().item()
+
+    @property
+    def words(self):
+        '''
+        Distinct tokens in order of first occurrence
+        '''
+        return self._words
@@ -0,0 +1,136 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Projection of documents into two dimensions so they can be plotted.
+
+Available methods:
+- mds: metric multidimensional scaling of the cosine distances among all
+  the documents. Needs O(n^2) memory, so it is only suitable for small
+  collections.
+- svd: the first two components of a truncated singular value decomposition
+  of the documents matrix.
+- landmark-mds: classical multidimensional scaling of the cosine distances
+  among a random sample of landmark documents, the rest of the documents
+  are placed by distance-based triangulation to the landmarks. Time and
+  memory are linear in the number of documents.
+"""
+
+import numpy as np
+from sklearn.manifold import MDS
+from sklearn.decomposition import TruncatedSVD
+from sklearn.metrics.pairwise import cosine_similarity
+from sklearn.preprocessing import normalize
+
+
+PROJECTION_METHODS = ('mds', 'svd', 'landmark-mds')
+
+# Memory (in MB) available to project the documents when the method is
+# chosen automatically
+MEMORY_BUDGET = 1024
+
+# Largest collection projected with MDS when the method is chosen
+# automatically. Besides memory, MDS time grows faster than n^2.
+MDS_MAX_DOCS = 3000
+
+# Approximate number of n x n float64 matrices kept in memory by MDS
+MDS_MATRICES = 4
+
+NUM_LANDMARKS = 300
+
+# Number of documents whose distances to the landmarks are computed at a time
+CHUNK_SIZE = 5000
+
+
+def choose_projection(num_docs, memory_budget=MEMORY_BUDGET):
+    '''
+    Choose MDS if the distances among all the documents fit in the memory
+    budget (in MB) and the collection is small, landmark MDS otherwise.
+    '''
+    mds_bytes = MDS_MATRICES * 8 * num_docs ** 2
+    if num_docs <= MDS_MAX_DOCS and mds_bytes <= memory_budget * 2 ** 20:
+        return 'mds'
+    return 'landmark-mds'
+
+
+def mds_projection(matrix, random_state=1):
+    dist = 1 - cosine_similarity(matrix)
+    mds = MDS(n_components=2, dissimilarity="precomputed",
+              random_state=random_state)
+    return mds.fit_transform(dist)
+
+
+def svd_projection(matrix, random_state=1):
+    if matrix.shape[1] <= 2:
+        # nothing to reduce, pad with zeros up to two dimensions
+        pos = np.zeros((matrix.shape[0], 2))
+        pos[:, :matrix.shape[1]] = matrix.toarray() \
+                                   if hasattr(matrix, 'toarray') else matrix
+        return pos
+    svd = TruncatedSVD(n_components=2, random_state=random_state)
+    return svd.fit_transform(matrix)
+
+
+def landmark_mds_projection(matrix, num_landmarks=NUM_LANDMARKS,
+                            random_state=1):
+    '''
+    Landmark MDS (de Silva and Tenenbaum, 2004) on cosine distances.
+    '''
+    num_docs = matrix.shape[0]
+    num_landmarks = min(num_landmarks, num_docs)
+    rng = np.random.RandomState(random_state)
+    landmarks = np.sort(rng.choice(num_docs, num_landmarks, replace=False))
+    matrix = normalize(matrix)
+    landmark_matrix = matrix[landmarks]
+    # classical MDS of the squared distances among landmarks
+    sq_dist = (1 - cosine_similarity(landmark_matrix)) ** 2
+    col_means = sq_dist.mean(axis=0)
+    centered = -0.5 * (sq_dist - col_means[np.newaxis, :] -
+                       sq_dist.mean(axis=1)[:, np.newaxis] + sq_dist.mean())
+    eigvals, eigvecs = np.linalg.eigh(centered)
+    top = np.argsort(eigvals)[::-1][:2]
+    eigvals = np.maximum(eigvals[top], np.finfo(float).eps)
+    # transposed pseudo-inverse of the landmark coordinates
+    pinv = eigvecs[:, top] / np.sqrt(eigvals)
+    pos = np.zeros((num_docs, 2))
+    pos[:, :pinv.shape[1]] = np.vstack([
+        -0.5 * ((1 - cosine_similarity(matrix[start:start+CHUNK_SIZE],
+                                       landmark_matrix)) ** 2 -
+                col_means).dot(pinv)
+        for start in range(0, num_docs, CHUNK_SIZE)
+    ])
+    return pos
+
+
+def project(matrix, method='auto', memory_budget=MEMORY_BUDGET,
+            random_state=1):
+    '''
+    Project the rows of matrix into two dimensions.
+
+    Parameters
+    ----------
+    matrix: sparse matrix or array of shape (n_docs, n_features)
+        The documents to project
+
+    method: string, 'auto' by default
+        One of PROJECTION_METHODS or 'auto' to choose it with
+        choose_projection().
+
+    memory_budget: int, MEMORY_BUDGET by default
+        Memory, in MB, available to project the documents.
+
+    random_state: int, 1 by default
+        Seed of the random number generator
+
+    Returns
+    -------
+    pos: array of shape (n_docs, 2) with the coordinates of each document
+    '''
+    if method == 'auto':
+        method = choose_projection(matrix.shape[0], memory_budget)
+    if method == 'mds':
+        return mds_projection(matrix, random_state)
+    elif method == 'svd':
+        return svd_projection(matrix, random_state)
+    elif method == 'landmark-mds':
+        return landmark_mds_projection(matrix, random_state=random_state)
+    raise Exception('Unknown projection method {}'.format(method))
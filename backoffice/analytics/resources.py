@@ -0,0 +1,115 @@
+# -*- coding: utf-8 -*-
+
+"""
+Local NLTK resources (corpora and models) required by the analytics modules.
+
+Resources are never downloaded while analyzing documents. They are read from
+the directory set in the ANALYTICS_NLTK_DATA environment variable
+(<backoffice>/nltk_data by default), which can be populated once with
+download_resources() or with the download_nltk_data management command.
+"""
+
+import os
+import nltk
+from nltk.corpus import stopwords
+from nltk.tag.perceptron import PerceptronTagger
+from threading import Lock
+
+
+NLTK_DATA_DIR = os.environ.get(
+    'ANALYTICS_NLTK_DATA',
+    os.path.join(os.path.dirname(os.path.dirname(os.path.realpath(__file__))),
+                 'nltk_data')
+)
+
+# Resources used by the analytics modules and their location inside a
+# NLTK data directory
+REQUIRED_RESOURCES = {
+    'stopwords': 'corpora/stopwords',
+    'punkt': 'tokenizers/punkt',
+    'averaged_perceptron_tagger': 'taggers/averaged_perceptron_tagger',
+    'vader_lexicon': 'sentiment/vader_lexicon.zip',
+}
+
+# the bundled directory takes precedence over the default NLTK locations
+if NLTK_DATA_DIR not in nltk.data.path:
+    nltk.data.path.insert(0, NLTK_DATA_DIR)
+
+_checked = False
+_check_lock = Lock()
+_stop_words = {}
+_pos_tagger = None
+
+
+class ResourceNotFoundError(LookupError):
+    '''
+    Raised when a NLTK resource required by the analytics modules isn't
+    available locally.
+    '''
+    pass
+
+
+def check_resources():
+    '''
+    Check that all the required NLTK resources are available locally. The
+    check is done only once per process.
+
+    Raises
+    ------
+    ResourceNotFoundError: if any of the resources is missing
+    '''
+    global _checked
+    if _checked:
+        return
+    with _check_lock:
+        if _checked:
+            return
+        missing = []
+        for name, path in sorted(REQUIRED_RESOURCES.items()):
+            try:
+                nltk.data.find(path)
+            except LookupError:
+                missing.append(name)
+        if missing:
+            raise ResourceNotFoundError(
+                'Missing NLTK resources: {}. Looked in: {}. Run '
+                '"python manage.py download_nltk_data" on a host with '
+                'network access to bundle them in {}'.format(
+                    ', '.join(missing), ', '.join(nltk.data.path),
+                    NLTK_DATA_DIR)
+            )
+        _checked = True
+
+
+def download_resources(download_dir=NLTK_DATA_DIR):
+    '''
+    Download all the required NLTK resources into download_dir.
+    '''
+    for name in sorted(REQUIRED_RESOURCES):
+        if not nltk.download(name, download_dir=download_dir, quiet=True):
+            raise ResourceNotFoundError(
+                'The NLTK resource {} could not be downloaded'.format(name)
+            )
+
+
+def get_stop_words(language='english'):
+    '''
+    Return the list of stop words of a language. The list is read from disk
+    only the first time it is requested.
+    '''
+    if language not in _stop_words:
+        check_resources()
+        _stop_words[language] = stopwords.words(language)
+    return _stop_words[language]
+
+
+def get_pos_tagger():
+    '''
+    Return the part-of-speech tagger shared by the whole process. Its model
+    is loaded only the first time it is requested.
+    '''
+    global _pos_tagger
+    if _pos_tagger is None:
+        check_resources()
+        _pos_tagger = PerceptronTagger()
+    return _pos_tagger
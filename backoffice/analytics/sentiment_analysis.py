@@ -4,7 +4,7 @@
 import nltk
 import os
 from nltk.sentiment.vader import SentimentIntensityAnalyzer
-from analytics.utils import tokenize_and_remove_stop_words, tokenize_and_stem, \
+from analytics.utils import get_text_preprocessor, tokenize_corpus, \
                   clean_emojis, translate_doc
 
 class SentimentAnalyzer:
@@ -33,6 +33,10 @@ class SentimentAnalyzer:
         If you use another language, the module will first translate each 
         document to english (using Google Translate AJAX API), so it can later
         re-use ntlk_vader algorithm for english docs.
+
+    n_jobs: int, 1 by default
+        Number of processes used to tokenize the documents. If -1, all the 
+        CPUs are used.
     """
 
     _sia = SentimentIntensityAnalyzer()
@@ -40,16 +44,18 @@ class SentimentAnalyzer:
 
     def __init__(self, neu_inf_lim=-0.3,
                  neu_sup_lim=0.3,
-                 language="english"):
+                 language="english", n_jobs=1):
         self.neu_inf_lim = neu_inf_lim
         self.neu_sup_lim = neu_sup_lim
         self.language=language
+        self.n_jobs = n_jobs
         self.translate = False
         self.need_normalization = False
         self.mlsent = {}
         self.spa_lemmas = []
         self.min_score = 100
         self.max_score = -100
+        self._preprocessor = get_text_preprocessor(language)
         if language == "spanish":
             self.load_spa_resources()
             self.algorithm = "ML-Senticon"
@@ -187,11 +193,26 @@ class SentimentAnalyzer:
         and polarity score is a float that ranges from -1 to 1.
         """
         # pre processing stage
+        pp_doc = self._preprocessor.tokenize(self.prepare_doc(doc), 
+                                             join_words=True)
+        return self.label_doc(doc, pp_doc)
+
+    def prepare_doc(self, doc):
+        """
+        Remove emojis from a given doc and translate it to english if the
+        language isn't supported natively.
+        """
         pp_doc = clean_emojis(doc)
         if self.translate:
             pp_doc = translate_doc(doc, src=self.src_lang, dest="en")
-        pp_doc = tokenize_and_remove_stop_words(text=pp_doc, join_words=True,
-                                                language=self.language)
+        return pp_doc
+
+    def label_doc(self, doc, pp_doc):
+        """
+        Returns the tuple (doc, predicted sentiment, polarity score) of a 
+        doc given its pre processed version (i.e., its tokens without stop
+        words joined by spaces).
+        """
         # get polarity score from pre processed doc
         score = self.get_polarity_score(pp_doc)
         # determine polarity from score and thresholds
@@ -203,16 +224,22 @@ class SentimentAnalyzer:
             predicted_sentiment = "pos"
         return (doc, predicted_sentiment, score)
 
-    def analyze_docs(self, docs):
+    def analyze_docs(self, docs, pp_docs=None):
         """
-        Analyzes a document collection by applying the analyze_doc() method
-        for each document.
+        Analyzes a document collection by pre processing all the documents
+        (in parallel when n_jobs is greater than 1) and labeling each one of
+        them. The pre processed documents can be supplied in pp_docs if
+        they were already computed.
         All the results are stored in the _tagged_docs attribute.
         Normalize the results if needed.
         """
+        if pp_docs is None:
+            pp_docs = tokenize_corpus([self.prepare_doc(doc) for doc in docs],
+                                      language=self.language, join_words=True,
+                                      n_jobs=self.n_jobs)
         results = []
-        for doc in docs:
-            results.append(self.analyze_doc(doc))
+        for doc, pp_doc in zip(docs, pp_docs):
+            results.append(self.label_doc(doc, pp_doc))
         if self.need_normalization and len(docs) > 1:
             results = self.normalize_scores(results)
         self._tagged_docs = results
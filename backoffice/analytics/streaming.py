@@ -0,0 +1,250 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Out-of-core clustering of collections that don't fit in memory.
+
+Documents are read in chunks, stemmed and vectorized with the hashing
+trick, so no vocabulary is kept, and a mini batch k-means model is fitted
+chunk by chunk. A second pass over the chunks assigns each document to a
+cluster and accumulates the term counts of each cluster and the most 
+frequent word of each stem, so top terms are shown as words. Memory 
+depends on the size of the chunks and the number of features, not on the
+number of documents.
+"""
+
+from collections import Counter
+import numpy as np
+import scipy.sparse as sp
+from sklearn.cluster import MiniBatchKMeans
+from sklearn.feature_extraction.text import HashingVectorizer
+from sklearn.preprocessing import normalize
+from analytics.utils import tokenize_corpus, get_text_preprocessor
+from analytics.hashing import BucketTerms, bucket, N_FEATURES
+
+
+class StreamingDocumentClustering:
+    '''
+    Cluster, with mini batch k-means, documents read in chunks.
+
+    Parameters
+    ----------
+    num_clusters : int, 5 by default
+        The number of clusters in which the documents will be grouped.
+
+    context_words : list, empty list by default
+        List of context-specific words that should notbe considered in the
+        analysis.
+
+    ngram_range: tuple, (1,1) by default
+        The lower and upper boundary of the range of n-values for different
+        n-grams to be extracted. All values of n such that
+        min_n <= n <= max_n will be used.
+
+    consider_urls: boolean, False by default
+        Whether URLs should be removed or not.
+
+    language: string, english by default
+        Language of the documents. Only the languages supported by the
+        library NLTK are supported.
+
+    n_features: int, N_FEATURES by default
+        Number of columns of the hashed term frequency matrices.
+
+    batch_size: int, 1000 by default
+        Number of documents of each mini batch. Each chunk is split in mini
+        batches, and the model is updated with one mini batch at a time.
+
+    random_state: int, 1 by default
+        Seed used to initialize the centroids, so the results of identical
+        clusterings are the same. If None, every run is different.
+
+    dtype: string, 'float32' by default
+        Type of the values of the matrices.
+
+    n_jobs: int, 1 by default
+        Number of processes used to tokenize each chunk. If -1, all the
+        CPUs are used.
+    '''
+
+    def __init__(self, num_clusters=5, context_words=[], ngram_range=(1,1),
+                 consider_urls=False, language='english',
+                 n_features=N_FEATURES, batch_size=1000, random_state=1,
+                 dtype='float32', n_jobs=1):
+        self.num_clusters = num_clusters
+        self.context_words = context_words
+        self.ngram_range = ngram_range
+        self.consider_urls = consider_urls
+        self.language = language
+        self.n_features = n_features
+        self.batch_size = batch_size
+        self.random_state = random_state
+        self.dtype = np.dtype(dtype)
+        self.n_jobs = n_jobs
+        # term counts, the rows are normalized as in DocumentClustering
+        # (tf-idf without idf)
+        self._hasher = HashingVectorizer(n_features=n_features,
+                                         ngram_range=ngram_range,
+                                         alternate_sign=False, norm=None,
+                                         dtype=self.dtype)
+        # properties
+        self._model = None
+        self._num_docs = 0
+        self._axes = None
+        self._center = None
+        self._cluster_term_counts = None
+        self._bucket_terms = None
+        self._stem_words = None
+        self._num_docs_per_cluster = np.zeros(num_clusters, dtype=np.int64)
+
+    def _tokenize(self, docs):
+        return tokenize_corpus(docs, language=self.language,
+                               context_words=self.context_words,
+                               remove_urls=not self.consider_urls,
+                               n_jobs=self.n_jobs)
+
+    def _stem(self, tokenized_docs):
+        # stems are derived from the tokens, which are also needed to show 
+        # the stems as words
+        preprocessor = get_text_preprocessor(self.language, stem=True)
+        return [' '.join(preprocessor.stem_token(token) for token in tokens)
+                for tokens in tokenized_docs]
+
+    def fit(self, read_chunks):
+        '''
+        Fit the model with a pass over the chunks of documents.
+
+        Parameters
+        ----------
+        read_chunks: callable
+            Function that returns a new iterator over the chunks (lists of
+            strings) of the collection each time it is called.
+
+        Returns
+        -------
+        self : StreamingDocumentClustering
+        '''
+        self._model = MiniBatchKMeans(n_clusters=self.num_clusters,
+                                      batch_size=self.batch_size,
+                                      random_state=self.random_state)
+        self._num_docs = 0
+        # the first mini batch must have, at least, one document per 
+        # cluster
+        pending = None
+        fitted = False
+        for docs in read_chunks():
+            self._num_docs += len(docs)
+            stemmed_docs = self._stem(self._tokenize(docs))
+            matrix = normalize(self._hasher.transform(stemmed_docs))
+            if pending is not None:
+                matrix = sp.vstack([pending, matrix], format='csr')
+                pending = None
+            if not fitted and matrix.shape[0] < self.num_clusters:
+                pending = matrix
+                continue
+            start = 0
+            while start < matrix.shape[0]:
+                size = self.batch_size if fitted else \
+                       max(self.batch_size, self.num_clusters)
+                self._model.partial_fit(matrix[start:start+size])
+                fitted = True
+                start += size
+        if not fitted:
+            raise Exception('There are less documents ({}) than clusters '
+                            '({})'.format(self._num_docs, self.num_clusters))
+        # documents are projected into the plane of the first two principal
+        # components of the centroids
+        centroids = self._model.cluster_centers_
+        self._center = centroids.mean(axis=0)
+        _, _, components = np.linalg.svd(centroids - self._center,
+                                         full_matrices=False)
+        self._axes = np.zeros((2, centroids.shape[1]))
+        self._axes[:min(2, components.shape[0])] = components[:2]
+        return self
+
+    def assign(self, read_chunks):
+        '''
+        Assign the documents to the clusters with a second pass over the
+        chunks, counting the terms of each cluster.
+
+        Parameters
+        ----------
+        read_chunks: callable
+            Function that returns a new iterator over the chunks (lists of
+            strings) of the collection each time it is called.
+
+        Returns
+        -------
+        A generator which yields, for each chunk, a tuple of the list of
+        documents, the cluster of each document and an array of shape
+        (n_docs, 2) with the coordinates of each document.
+        '''
+        analyzer = self._hasher.build_analyzer()
+        preprocessor = get_text_preprocessor(self.language, stem=True)
+        self._cluster_term_counts = sp.csr_matrix(
+            (self.num_clusters, self.n_features), dtype=np.int64
+        )
+        self._bucket_terms = BucketTerms(self.n_features)
+        self._stem_words = BucketTerms(self.n_features)
+        self._num_docs_per_cluster = np.zeros(self.num_clusters,
+                                              dtype=np.int64)
+        for docs in read_chunks():
+            tokenized_docs = self._tokenize(docs)
+            stemmed_docs = self._stem(tokenized_docs)
+            counts = self._hasher.transform(stemmed_docs)
+            matrix = normalize(counts)
+            labels = self._model.predict(matrix)
+            indicator = sp.csr_matrix(
+                (np.ones(len(labels), dtype=np.int64),
+                 (labels, np.arange(len(labels)))),
+                shape=(self.num_clusters, len(labels))
+            )
+            self._cluster_term_counts = self._cluster_term_counts + \
+                indicator.dot(counts.astype(np.int64))
+            self._bucket_terms.update(Counter(term for doc in stemmed_docs
+                                              for term in analyzer(doc)))
+            self._stem_words.update(Counter(token for tokens in tokenized_docs
+                                            for token in tokens),
+                                    key=preprocessor.stem_token)
+            self._num_docs_per_cluster += np.bincount(
+                labels, minlength=self.num_clusters
+            )
+            coords = np.asarray(matrix.dot(self._axes.T)) - \
+                     self._center.dot(self._axes.T)
+            yield docs, labels, coords
+
+    def _word(self, term):
+        # each stem of the term is shown as its most frequent word
+        return ' '.join(
+            self._stem_words.term(bucket(stem, self.n_features), stem)
+            for stem in term.split(' ')
+        )
+
+    def top_terms_per_cluster(self, num_terms_per_cluster=3):
+        '''
+        Compute the 'n' terms that occur the most in each cluster, with 
+        their stems shown as words. Only available after a pass of 
+        assign().
+
+        Returns
+        -------
+        top_terms : Dictionary of clusters and their top 'n' terms with
+        their number of occurrences
+        '''
+        top_terms = {}
+        for cluster in range(self.num_clusters):
+            row = self._cluster_term_counts.getrow(cluster)
+            top = np.argsort(-row.data, kind='mergesort')
+            top_terms[str(cluster)] = [
+                (self._word(self._bucket_terms.term(row.indices[i])), 
+                 int(row.data[i]))
+                for i in top[:num_terms_per_cluster]
+            ]
+        return top_terms
+
+    @property
+    def num_docs(self):
+        return self._num_docs
+
+    @property
+    def num_docs_per_cluster(self):
+        return dict(enumerate(self._num_docs_per_cluster.tolist()))
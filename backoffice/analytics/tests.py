@@ -1,7 +1,47 @@
+import re
+import tempfile
+from unittest import mock
+import nltk
+import numpy as np
+from nltk.stem.snowball import SnowballStemmer
 import pandas as pd
+from sklearn import metrics
 from django.test import TestCase
 from concept_extraction import ConceptExtractor
-from clustering import DocumentClustering
+import clustering as clustering_module
+from clustering import (
+    DocumentClustering, IterativeDocumentClustering, calinski_harabaz_score
+)
+from utils import TextPreprocessor
+from deduplication import DuplicateDetector
+from streaming import StreamingDocumentClustering
+from ngrams import NgramCounter
+from projection import choose_projection, landmark_mds_projection
+
+
+def legacy_tokenize(text, specific_words_to_delete=[], stem=False):
+    # tokenize_and_remove_stop_words() and tokenize_and_stem() as they were
+    # before TextPreprocessor, to check that it gives the same tokens
+    stop_words = nltk.corpus.stopwords.words('english') + ['.', ',', '--', 
+                                        '\'s', '?', ')', '(', ':', '\'', 
+                                        '\'re', '"', '-', '}', '{', u'—']
+    tokens = [word.lower() for sent in nltk.sent_tokenize(text) for word in 
+              nltk.word_tokenize(sent)]
+    cleaned_tokens = [word for word in tokens if word not in 
+                      set(stop_words)]
+    if stem:
+        cleaned_tokens = [re.sub('[^A-Za-z]', ' ', token) 
+                          for token in cleaned_tokens]
+    filtered_tokens = []
+    for token in cleaned_tokens:
+        if token not in specific_words_to_delete:
+            if re.search('[a-zA-Z]', token):
+                filtered_tokens.append(token.strip())
+    if stem:
+        stemmer = SnowballStemmer('english')
+        return [stemmer.stem(t) for t in filtered_tokens]
+    return filtered_tokens
+
 
 class AnalyticsTestCase(TestCase):
     def setUp(self):
@@ -64,4 +104,229 @@ class AnalyticsTestCase(TestCase):
         self.assertEqual('need, people, help', terms_clusters[2])
         self.assertEqual('school, would, help', terms_clusters[3])
         self.assertEqual('kids, school, help', terms_clusters[4])
-        
\ No newline at end of file
+
+    def test_stem_cache(self):
+        tp = TextPreprocessor(stem=True)
+        stemmed_docs = tp.tokenize_many(self.ideas, self.context_words)
+        misses = tp.stem_cache_info().misses
+        # every token is stemmed only once
+        self.assertEqual(stemmed_docs, 
+                         tp.tokenize_many(self.ideas, self.context_words))
+        self.assertEqual(misses, tp.stem_cache_info().misses)
+
+    def test_text_preprocessor_matches_legacy_tokenizer(self):
+        for stem in [False, True]:
+            tp = TextPreprocessor(stem=stem)
+            for idea in self.ideas[:200]:
+                self.assertEqual(
+                    legacy_tokenize(idea, self.context_words, stem),
+                    tp.tokenize(idea, self.context_words))
+
+    def test_sparse_calinski_harabaz_score(self):
+        dc = DocumentClustering(num_clusters=5, 
+                                context_words=self.context_words, 
+                                ngram_range=(1,3), min_df=0.1, max_df=0.9,
+                                compute_metrics=False, dtype='float64')
+        dc.clustering(self.ideas)
+        matrix = dc._tfidf_matrix
+        self.assertAlmostEqual(
+            metrics.calinski_harabaz_score(matrix.toarray(), dc._clusters),
+            calinski_harabaz_score(matrix, dc._clusters))
+
+    def test_cached_linkage_tree(self):
+        cache_dir = tempfile.mkdtemp()
+        settings = dict(context_words=self.context_words, min_df=0.1, 
+                        max_df=0.9, algorithm='agglomerative', 
+                        compute_metrics=False, cache_dir=cache_dir)
+        DocumentClustering(num_clusters=3, **settings).clustering(self.ideas)
+        dc = DocumentClustering(num_clusters=5, **settings)
+        self.assertTrue(dc.has_cached_tree())
+        dc.clustering(self.ideas)
+        # cutting the cached tree gives the clusters of a new clustering
+        fresh_dc = DocumentClustering(num_clusters=5, 
+                                      **dict(settings, cache_dir=None))
+        fresh_dc.clustering(self.ideas)
+        self.assertEqual(1.0, metrics.adjusted_rand_score(
+            fresh_dc._model.labels_, dc._clusters))
+
+    def test_automatic_num_clusters(self):
+        dc = DocumentClustering(num_clusters='auto', k_range=(2, 6),
+                                context_words=self.context_words, 
+                                min_df=0.1, max_df=0.9, random_state=1,
+                                selection_metric='calinski-harabaz', n_jobs=2)
+        dc.clustering(self.ideas)
+        self.assertEqual([2, 3, 4, 5, 6], sorted(dc.k_scores))
+        best_k = max(dc.k_scores, key=dc.k_scores.get)
+        self.assertEqual(best_k, dc.selected_num_clusters)
+        self.assertEqual(best_k, len(set(dc._clusters)))
+
+    def test_lsa_reduction(self):
+        dc = DocumentClustering(num_clusters=5, n_components=20,
+                                context_words=self.context_words, 
+                                ngram_range=(1,2), min_df=0.01, max_df=0.9,
+                                random_state=1)
+        dc.clustering(self.ideas)
+        # clustering, metrics and projection use the normalized reduced docs
+        reduced_matrix = dc.reduced_matrix
+        self.assertEqual((len(self.ideas), 20), reduced_matrix.shape)
+        np.testing.assert_allclose(np.ones(len(self.ideas)),
+                                   np.linalg.norm(reduced_matrix, axis=1),
+                                   rtol=1e-4)
+        self.assertEqual(5, len(set(dc.labels)))
+        self.assertIsNotNone(dc.silhouette_score)
+        self.assertEqual(len(self.ideas), 
+                         len(dc.get_coordinate_vectors()['x']))
+
+    def test_warm_started_clustering(self):
+        settings = dict(context_words=self.context_words, min_df=0.1, 
+                        max_df=0.9, random_state=1, compute_metrics=False)
+        old_ideas = self.ideas[:700]
+        dc = DocumentClustering(num_clusters=5, **settings)
+        dc.clustering(old_ideas)
+        model = dc.export_model()
+        warm_dc = DocumentClustering(num_clusters=5, init_model=model, 
+                                     **settings)
+        warm_dc.clustering(self.ideas)
+        # a single fit from the old centroids keeps the clusters' identities
+        self.assertEqual(1, warm_dc._model.n_init)
+        same_labels = sum(old == new for old, new in 
+                          zip(dc.labels, warm_dc.labels[:len(old_ideas)]))
+        self.assertGreater(same_labels / len(old_ideas), 0.8)
+        # a model with another number of clusters isn't used
+        cold_dc = DocumentClustering(num_clusters=4, init_model=model, 
+                                     **settings)
+        cold_dc.clustering(self.ideas)
+        self.assertNotEqual(1, cold_dc._model.n_init)
+
+    def test_projection_selection(self):
+        self.assertEqual('mds', choose_projection(1000))
+        self.assertEqual('landmark-mds', choose_projection(100000))
+        # MDS of 2000 docs doesn't fit in 1 MB
+        self.assertEqual('landmark-mds', 
+                         choose_projection(2000, memory_budget=1))
+
+    def test_landmark_mds_projection(self):
+        dc = DocumentClustering(num_clusters=5, projection='landmark-mds',
+                                context_words=self.context_words, 
+                                min_df=0.1, max_df=0.9, compute_metrics=False)
+        dc.clustering(self.ideas)
+        coords = dc.get_coordinate_vectors()
+        self.assertEqual(['docs', 'label', 'x', 'y'], sorted(coords))
+        self.assertEqual(len(dc.docs), len(coords['x']))
+        self.assertEqual(len(dc.docs), len(coords['y']))
+        pos = landmark_mds_projection(dc._tfidf_matrix, num_landmarks=50)
+        self.assertEqual((len(dc.docs), 2), pos.shape)
+        self.assertTrue(np.isfinite(pos).all())
+
+    def test_iterative_clustering_tokenizes_once(self):
+        idc = IterativeDocumentClustering(num_clusters=3, threshold=0.4,
+                                          n_sub_clusters=2,
+                                          context_words=self.context_words)
+        tokenize = mock.patch.object(
+            clustering_module, 'tokenize_corpus', 
+            wraps=clustering_module.tokenize_corpus
+        )
+        project = mock.patch.object(
+            DocumentClustering, 'get_coordinate_vectors', autospec=True,
+            side_effect=DocumentClustering.get_coordinate_vectors
+        )
+        with tokenize as tokenize_mock, project as project_mock:
+            idc.clustering(self.ideas)
+        # stems and tokens of the whole collection are computed once, and 
+        # only the first clustering is projected
+        self.assertEqual(2, tokenize_mock.call_count)
+        self.assertEqual(1, project_mock.call_count)
+        self.assertGreater(len(idc.level_times), 1)
+        sizes = [len(data) for data in idc.clusters_data.values()]
+        self.assertEqual(len(self.ideas), sum(sizes))
+        self.assertTrue(all(size <= int(0.4 * len(self.ideas)) 
+                            for size in sizes))
+        self.assertEqual(sorted(idc.clusters_data), 
+                         sorted(idc.top_terms_per_cluster))
+
+    def test_concurrent_iterative_clustering(self):
+        settings = dict(num_clusters=3, threshold=0.4, n_sub_clusters=2,
+                        context_words=self.context_words)
+        idc = IterativeDocumentClustering(n_jobs=1, **settings)
+        idc.clustering(self.ideas)
+        concurrent_idc = IterativeDocumentClustering(n_jobs=2, **settings)
+        concurrent_idc.clustering(self.ideas)
+        # sub clusters keep their dotted labels and their documents
+        self.assertTrue(any('.' in label for label in idc.clusters_data))
+        self.assertEqual(idc.clusters_data, concurrent_idc.clusters_data)
+        self.assertEqual(idc.top_terms_per_cluster, 
+                         concurrent_idc.top_terms_per_cluster)
+        self.assertEqual(len(idc.level_times), 
+                         len(concurrent_idc.level_times))
+
+    def test_duplicate_detector(self):
+        copies = ['Please add more protected bike lanes downtown, the ' + 
+                  'traffic on main street is really dangerous for our kids' +
+                  suffix for suffix in ['', '!', ' today']]
+        docs = copies + self.ideas[:50]
+        dd = DuplicateDetector().fit(docs)
+        self.assertEqual(dd.labels[0], dd.labels[1])
+        self.assertEqual(dd.labels[0], dd.labels[2])
+        self.assertEqual(3, dd.weights[dd.labels[0]])
+        self.assertEqual(len(docs), sum(dd.weights))
+
+    def test_hashing_vectorizer(self):
+        settings = dict(context_words=self.context_words, ngram_range=(1,2),
+                        min_df=0.05, max_df=0.9, compute_metrics=False)
+        dc = DocumentClustering(**settings).clustering(self.ideas)
+        hashing_dc = DocumentClustering(vectorizer='hashing', **settings)
+        hashing_dc.clustering(self.ideas)
+        # without collisions, buckets are shown as the terms they hold
+        self.assertEqual(sorted(dc.features), sorted(hashing_dc.features))
+
+    def test_float32_labels(self):
+        settings = dict(num_clusters=5, context_words=self.context_words, 
+                        ngram_range=(1,3), min_df=0.1, max_df=0.9, 
+                        random_state=1, compute_metrics=False)
+        dc32 = DocumentClustering(dtype='float32', **settings)
+        dc32.clustering(self.ideas)
+        dc64 = DocumentClustering(dtype='float64', **settings)
+        dc64.clustering(self.ideas)
+        self.assertEqual('float32', dc32._tfidf_matrix.dtype.name)
+        self.assertEqual(dc64._clusters, dc32._clusters)
+
+    def test_streaming_document_clustering(self):
+        read_chunks = lambda: (self.ideas[start:start+30] 
+                               for start in range(0, len(self.ideas), 30))
+        sdc = StreamingDocumentClustering(num_clusters=3, batch_size=30,
+                                          context_words=self.context_words,
+                                          random_state=1)
+        sdc.fit(read_chunks)
+        labels = [label for docs, chunk_labels, coords in 
+                  sdc.assign(read_chunks) for label in chunk_labels]
+        self.assertEqual(len(self.ideas), len(labels))
+        self.assertEqual(len(self.ideas), sum(sdc.num_docs_per_cluster.values()))
+        top_terms = sdc.top_terms_per_cluster()
+        self.assertEqual(3, len(top_terms))
+        # stems are shown as words of the documents
+        for terms in top_terms.values():
+            for term, count in terms:
+                self.assertTrue(any(term in idea.lower() for idea in self.ideas))
+
+    def test_tfidf_top_terms(self):
+        dc = DocumentClustering(num_clusters=3, top_terms_method='tfidf',
+                                context_words=self.context_words, 
+                                random_state=1, compute_metrics=False)
+        dc.clustering(self.ideas)
+        top_terms = dc.top_terms_per_cluster()
+        self.assertEqual(3, len(top_terms))
+        for terms in top_terms.values():
+            scores = [score for term, score in terms]
+            self.assertEqual(sorted(scores, reverse=True), scores)
+            # stems are shown as words of the documents
+            for term, score in terms:
+                self.assertTrue(any(term in idea.lower() for idea in self.ideas))
+
+    def test_ngram_counter(self):
+        tokens = ' '.join(self.ideas[:100]).lower().split()
+        counter = NgramCounter(4).count(tokens)
+        for n in range(1, 5):
+            fdist = nltk.FreqDist(nltk.ngrams(tokens, n))
+            expected = [(ngram[0] if n == 1 else ngram, count) 
+                        for ngram, count in fdist.most_common(20)]
+            self.assertEqual(expected, counter.most_common(n, 20))
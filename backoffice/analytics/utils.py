@@ -7,76 +7,283 @@
 import re
 import nltk
 import random
-from nltk.corpus import stopwords
+from functools import lru_cache
+from multiprocessing import Pool, cpu_count
 from nltk.stem.snowball import SnowballStemmer
 from bs4 import BeautifulSoup
 from googletrans import Translator
 from time import sleep 
+from analytics.resources import download_resources, get_stop_words, \
+                               get_pos_tagger
 
 
 def download_stop_words():
-    # Downloading English stopwords
-    nltk.download('stopwords')
-    nltk.download('punkt')
+    # Downloading NLTK stopwords and tokenizers (as well as the rest of the 
+    # resources required) into the bundled NLTK data directory
+    download_resources()
+
+
+# Maximum number of distinct tokens whose stem is memoized per language
+STEM_CACHE_SIZE = 100000
+
+
+# Maximum number of distinct tokens whose part-of-speech tag is memoized 
+# when tagging tokens without context
+TAG_CACHE_SIZE = 100000
+
+
+# Number of documents tokenized by each worker process at a time
+TOKENIZE_CHUNK_SIZE = 500
+
+
+# Punctuation tokens emitted by the NLTK tokenizers that are removed as if
+# they were stop words
+PUNCTUATION_TOKENS = ['.', ',', '--', '\'s', '?', ')', '(', ':', '\'', 
+                      '\'re', '"', '-', '}', '{', u'—']
 
 
 '''
 Based on http://brandonrose.org/clustering
 '''
 
+class TextPreprocessor:
+    '''
+    Tokenize documents removing stop words, punctuation and context-specific
+    words and, optionally, stemming the remaining tokens.
+    
+    The stop words set, the regular expressions and the stemmer are built 
+    once when the object is created, so the same instance should be reused 
+    to process a whole corpus. Use get_text_preprocessor() to obtain the 
+    instance shared by the whole process.
+    
+    Parameters
+    ----------
+    language: string, english by default
+        Language of the documents. Only the languages supported by the
+        library NLTK are supported.
+    
+    stem: boolean, False by default
+        Whether the tokens should be reduced to their stems.
+    
+    stem_cache_size: int, STEM_CACHE_SIZE by default
+        Number of distinct tokens whose stem is kept in a least recently 
+        used cache, so each token is stemmed only once.
+    '''
+    
+    _reg_exp_urls = re.compile(r'^https?:\/\/.*[\r\n]*', flags=re.MULTILINE)
+    _reg_exp_letter = re.compile('[a-zA-Z]')
+    _reg_exp_non_letter = re.compile('[^A-Za-z]')
+    
+    def __init__(self, language='english', stem=False, 
+                 stem_cache_size=STEM_CACHE_SIZE):
+        self.language = language
+        self.stem = stem
+        self._stop_words = frozenset(get_stop_words(language) + 
+                                     PUNCTUATION_TOKENS)
+        self._stem_token = None
+        if stem:
+            stemmer = SnowballStemmer(language)
+            self._stem_token = lru_cache(maxsize=stem_cache_size)(stemmer.stem)
+    
+    def stem_cache_info(self):
+        '''
+        Return the hits, misses, maximum size and current size of the stem 
+        cache or None if the preprocessor doesn't stem.
+        '''
+        if self._stem_token is None:
+            return None
+        return self._stem_token.cache_info()
+    
+    def stem_token(self, token):
+        '''
+        Stem a token that was already tokenized (i.e., in lower case and
+        not a stop word) as tokenize() does.
+        '''
+        if self._stem_token is None:
+            return token
+        return self._stem_token(self._reg_exp_non_letter.sub(' ', token).\
+                                strip())
+    
+    def remove_urls(self, doc):
+        '''
+        Remove the lines of the document that start with a URL.
+        '''
+        return self._reg_exp_urls.sub('', doc)
+    
+    def tokenize(self, doc, context_words=[], join_words=False, 
+                 remove_urls=False):
+        '''
+        Tokenize a document.
+        
+        Parameters
+        ----------
+        doc: string
+            The document to tokenize
+        
+        context_words: list, empty list by default
+            List of context-specific words that should be removed.
+        
+        join_words: boolean, False by default
+            Whether the tokens should be returned as a single string of 
+            space-separated tokens.
+        
+        remove_urls: boolean, False by default
+            Whether URLs should be removed before tokenizing.
+        
+        Returns
+        -------
+        tokens: list of tokens or string if join_words is True
+        '''
+        return self._tokenize(doc, frozenset(context_words), join_words,
+                              remove_urls)
+    
+    def tokenize_many(self, docs, context_words=[], join_words=False, 
+                      remove_urls=False):
+        '''
+        Tokenize a collection of documents. Parameters are the same of
+        tokenize().
+        
+        Returns
+        -------
+        tokenized_docs: list with the tokens of each document
+        '''
+        context_words = frozenset(context_words)
+        return [self._tokenize(doc, context_words, join_words, remove_urls) 
+                for doc in docs]
+    
+    def _tokenize(self, doc, context_words, join_words, remove_urls):
+        if remove_urls:
+            doc = self.remove_urls(doc)
+        # first tokenize by sentence, then by word to ensure that punctuation 
+        # is caught as it's own token
+        tokens = [word.lower() for sent in nltk.sent_tokenize(doc) for word in 
+                  nltk.word_tokenize(sent)]
+        # removing stop words
+        tokens = [word for word in tokens if word not in self._stop_words]
+        if self.stem:
+            tokens = [self._reg_exp_non_letter.sub(' ', token) 
+                      for token in tokens]
+        # keep only tokens that have letters and aren't context words
+        tokens = [token.strip() for token in tokens 
+                  if token not in context_words and 
+                  self._reg_exp_letter.search(token)]
+        if self.stem:
+            tokens = [self._stem_token(token) for token in tokens]
+        if join_words:
+            return ' '.join(tokens)
+        else:
+            return tokens
+
+
+_text_preprocessors = {}
+
+
+def get_text_preprocessor(language='english', stem=False):
+    '''
+    Return the TextPreprocessor of the given language and stemming mode 
+    shared by the whole process, creating it the first time it is requested.
+    '''
+    key = (language, stem)
+    if key not in _text_preprocessors:
+        _text_preprocessors[key] = TextPreprocessor(language, stem)
+    return _text_preprocessors[key]
+
+
+def _tokenize_chunk(args):
+    # Worker function of tokenize_corpus(). Each process builds its own 
+    # preprocessor the first time it receives a chunk.
+    docs, language, stem, context_words, join_words, remove_urls = args
+    preprocessor = get_text_preprocessor(language, stem)
+    return preprocessor.tokenize_many(docs, context_words, join_words, 
+                                      remove_urls)
+
+
+def tokenize_corpus(docs, language='english', stem=False, context_words=[], 
+                    join_words=False, remove_urls=False, n_jobs=1, 
+                    chunksize=TOKENIZE_CHUNK_SIZE):
+    '''
+    Tokenize a collection of documents splitting the work in chunks that
+    are processed by a pool of worker processes. The documents are 
+    tokenized serially when n_jobs is 1 or when there aren't enough 
+    documents to fill more than one chunk.
+    
+    Parameters
+    ----------
+    docs: iterable
+        An iterable which yields a list of strings
+    
+    language, stem: 
+        See TextPreprocessor.
+    
+    context_words, join_words, remove_urls:
+        See TextPreprocessor.tokenize().
+    
+    n_jobs: int, 1 by default
+        Number of worker processes. If -1, all the CPUs are used.
+    
+    chunksize: int, TOKENIZE_CHUNK_SIZE by default
+        Number of documents sent to a worker process at a time.
+    
+    Returns
+    -------
+    tokenized_docs: list with the tokens of each document in the same order
+    of docs
+    '''
+    docs = list(docs)
+    if n_jobs is None or n_jobs < 1:
+        n_jobs = cpu_count()
+    if n_jobs == 1 or len(docs) <= chunksize:
+        preprocessor = get_text_preprocessor(language, stem)
+        return preprocessor.tokenize_many(docs, context_words, join_words, 
+                                          remove_urls)
+    chunks = [(docs[i:i+chunksize], language, stem, context_words, 
+               join_words, remove_urls) 
+              for i in range(0, len(docs), chunksize)]
+    with Pool(processes=min(n_jobs, len(chunks))) as pool:
+        tokenized_chunks = pool.map(_tokenize_chunk, chunks)
+    return [tokens for chunk in tokenized_chunks for tokens in chunk]
+
+
+@lru_cache(maxsize=TAG_CACHE_SIZE)
+def _tag_token(token):
+    return get_pos_tagger().tag([token])[0][1]
+
+
+def pos_tag_corpus(tokenized_docs, context_free=False):
+    '''
+    Tag the part-of-speech of the tokens of a collection of documents using 
+    the tagger shared by the process.
+    
+    Parameters
+    ----------
+    tokenized_docs: iterable
+        An iterable which yields the list of tokens of each document
+    
+    context_free: boolean, False by default
+        If True, each distinct token is tagged only once regardless of the
+        tokens around it and its tag is memoized. Faster on large corpora,
+        but tags may differ from the ones obtained in context.
+    
+    Returns
+    -------
+    tagged_docs: list with the (token, tag) tuples of each document
+    '''
+    if context_free:
+        return [[(token, _tag_token(token)) for token in tokens] 
+                for tokens in tokenized_docs]
+    return get_pos_tagger().tag_sents(tokenized_docs)
+
+
 def tokenize_and_remove_stop_words(text, specific_words_to_delete=[], 
                                    join_words=False, language='english'):
-    # define stop words
-    stop_words = nltk.corpus.stopwords.words(language) + ['.', ',', '--', 
-                                        '\'s', '?', ')', '(', ':', '\'', 
-                                        '\'re', '"', '-', '}', '{', u'—']
-    # first tokenize by sentence, then by word to ensure that punctuation 
-    # is caught as it's own token
-    tokens = [word.lower() for sent in nltk.sent_tokenize(text) for word in 
-              nltk.word_tokenize(sent)]
-    # removing stop words
-    cleaned_tokens = [word for word in tokens if word not in 
-                      set(stop_words)]
-    # keep only letter
-    alpha_tokens = cleaned_tokens
-    filtered_tokens = []
-    for token in alpha_tokens:
-        if token not in specific_words_to_delete:
-            if re.search('[a-zA-Z]', token):
-                filtered_tokens.append(token.strip())
-    if join_words:
-        return ' '.join(filtered_tokens)
-    else:
-        return filtered_tokens
+    preprocessor = get_text_preprocessor(language)
+    return preprocessor.tokenize(text, specific_words_to_delete, join_words)
 
 
 def tokenize_and_stem(text, specific_words_to_delete=[], 
                       join_words=False, language='english'):
-    # define stop words
-    stop_words = nltk.corpus.stopwords.words(language) + [ '.', ',', '--', 
-                                        '\'s', '?', ')', '(', ':', '\'', 
-                                        '\'re', '"', '-', '}', '{', u'—', ]
-    # first tokenize by sentence, then by word to ensure that punctuation 
-    # is caught as it's own token
-    tokens = [word.lower() for sent in nltk.sent_tokenize(text) for word in 
-              nltk.word_tokenize(sent)]
-    # removing stop words
-    cleaned_tokens = [word for word in tokens if word not in 
-                      set(stop_words)]
-    # keep only letter
-    alpha_tokens = [re.sub('[^A-Za-z]', ' ', token) for token in cleaned_tokens]
-    filtered_tokens = []
-    for token in alpha_tokens:
-        if token not in specific_words_to_delete:
-            if re.search('[a-zA-Z]', token):
-                filtered_tokens.append(token.strip())
-    # stemming
-    stemmer = SnowballStemmer(language)
-    stems = [stemmer.stem(t) for t in filtered_tokens]
-    if join_words:
-        return ' '.join(stems)
-    else:
-        return stems
+    preprocessor = get_text_preprocessor(language, stem=True)
+    return preprocessor.tokenize(text, specific_words_to_delete, join_words)
 
 def clean_html_tags(raw_html):
     return BeautifulSoup(raw_html, "lxml").text
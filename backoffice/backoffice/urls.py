@@ -58,6 +58,8 @@ urlpatterns = [
     url(r'^api/analysis/sentiment-analysis/(?P<pk>[0-9]+)/$', views.SentimentAnalysisDetail.as_view()),
     # ex: /api/analysis/doc-clustering/doc-clustering_id
     url(r'^api/analysis/doc-clustering/(?P<pk>[0-9]+)/$', views.DocumentClusteringDetail.as_view()),
+    # ex: /api/analysis/doc-clustering/doc-clustering_id/assign/
+    url(r'^api/analysis/doc-clustering/(?P<pk>[0-9]+)/assign/$', views.DocumentClusteringAssign.as_view()),
     # ex: /api/analysis/concept-extraction/concept-extraction_id
     url(r'^api/analysis/concept-extraction/(?P<pk>[0-9]+)/$', views.ConceptExtractionDetail.as_view()),
     # ex: /api/analysis/doc-classification/doc-classification_id
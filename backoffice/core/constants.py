@@ -13,6 +13,8 @@ DOCUMENT_CLASSIFICATION = 4
 NOT_EXECUTED = 1
 IN_PROGRESS = 2
 EXECUTED = 3
+QUEUED = 4
+FAILED = 5
 
 # Creation Status
 DRAFT = 1
@@ -0,0 +1,191 @@
+import gzip
+import hashlib
+import json
+import os
+import pickle
+import shutil
+import numpy as np
+from django.conf import settings
+from core.models import Dataset
+from analytics.utils import tokenize_corpus, pos_tag_corpus, clean_emojis
+
+
+CORPORA_DIR = os.path.join(settings.MEDIA_ROOT, 'corpora')
+
+
+def encode_token_lists(token_lists):
+    """
+    Encode a list of lists of tokens as a vocabulary plus an array of
+    integer token ids and an array with the offset of each list
+    """
+    vocab = {}
+    ids = []
+    offsets = [0]
+    for tokens in token_lists:
+        ids.extend(vocab.setdefault(token, len(vocab)) for token in tokens)
+        offsets.append(len(ids))
+    return {
+        'vocab': list(vocab),
+        'ids': np.array(ids, dtype=np.int32),
+        'offsets': np.array(offsets, dtype=np.int64)
+    }
+
+
+def decode_token_lists(encoded):
+    """
+    Decode the lists of tokens encoded by encode_token_lists
+    """
+    vocab = encoded['vocab']
+    ids = encoded['ids'].tolist()
+    offsets = encoded['offsets'].tolist()
+    return [
+        [vocab[i] for i in ids[offsets[j]:offsets[j+1]]]
+        for j in range(len(offsets)-1)
+    ]
+
+
+class DatasetCorpus:
+    """
+    Preprocessed version of the documents of a stored dataset.
+
+    The docs and each preprocessing layer (tokens, stems, part-of-speech
+    tags and the input of the sentiment analyzer) are computed the first
+    time they are requested and saved compressed on disk, so the following
+    analyses on the same dataset load them instead of recomputing them.
+    Artifacts are keyed by the dataset, the selected columns, the kind of
+    docs (labeled, i.e. (text, label) tuples for the classification, or
+    plain texts) and the preprocessing settings.
+    """
+
+    def __init__(self, dataset_id, columns, language='english',
+                 context_words=[], consider_urls=False, n_jobs=1,
+                 labeled=False):
+        self.dataset_id = dataset_id
+        self.columns = list(columns)
+        self.language = language
+        self.context_words = list(context_words)
+        self.consider_urls = consider_urls
+        self.n_jobs = n_jobs
+        self.labeled = labeled
+        dataset = Dataset.objects.get(id=dataset_id)
+        key = json.dumps([
+            str(dataset.file), self.columns, language,
+            sorted(self.context_words), consider_urls, labeled
+        ])
+        self.key = hashlib.sha1(key.encode('utf-8')).hexdigest()
+        kind = 'labeled' if labeled else 'unlabeled'
+        self._dir = os.path.join(CORPORA_DIR, str(dataset_id), kind, self.key)
+        self._layers = {}
+
+    def __getstate__(self):
+        # layers are loaded again from disk after unpickling
+        state = self.__dict__.copy()
+        state['_layers'] = {}
+        return state
+
+    @classmethod
+    def delete_all(cls, dataset_id):
+        """
+        Delete the artifacts of all the corpora of a dataset
+        """
+        shutil.rmtree(os.path.join(CORPORA_DIR, str(dataset_id)),
+                      ignore_errors=True)
+
+    @property
+    def directory(self):
+        """
+        Directory of the artifacts of the corpus. Analyzers can save there
+        intermediate results that only depend on the preprocessed documents
+        """
+        return self._dir
+
+    def _path(self, layer):
+        return os.path.join(self._dir, layer + '.pkl.gz')
+
+    def has_layer(self, layer):
+        return layer in self._layers or os.path.exists(self._path(layer))
+
+    def _load(self, layer):
+        if layer not in self._layers and os.path.exists(self._path(layer)):
+            with gzip.open(self._path(layer), 'rb') as f:
+                self._layers[layer] = pickle.load(f)
+        return self._layers.get(layer)
+
+    def _save(self, layer, data):
+        os.makedirs(self._dir, exist_ok=True)
+        tmp_path = self._path(layer) + '.tmp.' + str(os.getpid())
+        with gzip.open(tmp_path, 'wb') as f:
+            pickle.dump(data, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, self._path(layer))
+        self._layers[layer] = data
+
+    def _token_layer(self, layer, build):
+        encoded = self._load(layer)
+        if encoded is None:
+            encoded = encode_token_lists(build())
+            self._save(layer, encoded)
+        return decode_token_lists(encoded)
+
+    @property
+    def docs(self):
+        """
+        Documents of the corpus as created from the dataset
+        """
+        return self._load('docs')
+
+    def save_docs(self, docs):
+        self._save('docs', list(docs))
+
+    @property
+    def texts(self):
+        """
+        Text of the documents (i.e., without labels in case of labeled docs)
+        """
+        return [doc if isinstance(doc, str) else doc[0] for doc in self.docs]
+
+    def tokens(self):
+        """
+        Tokens of each document without stop words and context words
+        """
+        return self._token_layer('tokens', lambda: tokenize_corpus(
+            self.texts, language=self.language,
+            context_words=self.context_words,
+            remove_urls=not self.consider_urls, n_jobs=self.n_jobs
+        ))
+
+    def stems(self, join_words=False):
+        """
+        Stems of each document without stop words and context words
+        """
+        stems = self._token_layer('stems', lambda: tokenize_corpus(
+            self.texts, language=self.language, stem=True,
+            context_words=self.context_words,
+            remove_urls=not self.consider_urls, n_jobs=self.n_jobs
+        ))
+        if join_words:
+            return [' '.join(doc_stems) for doc_stems in stems]
+        return stems
+
+    def pos_tags(self, context_free=False):
+        """
+        List of (token, tag) tuples of each document
+        """
+        tokens = self.tokens()
+        layer = 'pos_tags_context_free' if context_free else 'pos_tags'
+        tags = self._token_layer(layer, lambda: [
+            [tag for (token, tag) in tagged_doc]
+            for tagged_doc in pos_tag_corpus(tokens, context_free)
+        ])
+        return [list(zip(doc_tokens, doc_tags))
+                for doc_tokens, doc_tags in zip(tokens, tags)]
+
+    def sentiment_docs(self):
+        """
+        Documents pre processed as the sentiment analyzer does for languages
+        supported natively (i.e., without emojis and stop words)
+        """
+        tokens = self._token_layer('sentiment_tokens', lambda: tokenize_corpus(
+            [clean_emojis(text) for text in self.texts],
+            language=self.language, n_jobs=self.n_jobs
+        ))
+        return [' '.join(doc_tokens) for doc_tokens in tokens]
@@ -0,0 +1,248 @@
+import logging
+import os
+import pickle
+import socket
+import time
+import traceback
+from datetime import timedelta
+from threading import Thread, Event
+from django.conf import settings
+from django.db import connection, transaction, IntegrityError
+from django.db.models import F
+from django.utils import timezone
+from core.models import Analysis, AnalysisJob
+from core.constants import *
+
+
+logger = logging.getLogger(__name__)
+
+# Number of times a job is executed, when its worker is lost, before it is
+# marked as failed
+MAX_ATTEMPTS = getattr(settings, 'ANALYSIS_JOB_MAX_ATTEMPTS', 3)
+
+# Seconds between the heartbeats of a running job
+HEARTBEAT_INTERVAL = getattr(settings, 'ANALYSIS_JOB_HEARTBEAT', 30)
+
+# Seconds without heartbeats after which a running job is considered lost
+STALE_AFTER = getattr(settings, 'ANALYSIS_JOB_STALE_AFTER', 300)
+
+
+def set_analysis_status(analysis_id, state):
+    """
+    Mirror the state of a job into the status of its analysis and of the
+    analyses waiting for the same result
+    """
+    analysis = Analysis.objects.filter(id=analysis_id).first()
+    if analysis is None:
+        # the analysis was deleted while its job was running
+        return
+    Analysis.objects.filter(id=analysis_id).update(analysis_status_id=state)
+    if analysis.result_key and state == FAILED:
+        Analysis.objects.filter(
+            result_key=analysis.result_key,
+            analysis_status_id__in=[QUEUED, IN_PROGRESS]
+        ).update(analysis_status_id=FAILED)
+
+
+def close_waiting_jobs(analysis_id, state):
+    """
+    Close the queued jobs of the identical analyses that were waiting for 
+    the result of an analysis and that got its final status along with it
+    """
+    analysis = Analysis.objects.filter(id=analysis_id).first()
+    if analysis is None or not analysis.result_key:
+        return
+    AnalysisJob.objects.filter(
+        state=QUEUED, analysis__result_key=analysis.result_key,
+        analysis__analysis_status_id=state
+    ).update(state=state)
+
+
+def reuse_executed_result(analysis_id):
+    """
+    Copy the result of an executed identical analysis, if there is one, 
+    into the analysis. Return whether the result was copied
+    """
+    analysis = Analysis.objects.get(id=analysis_id)
+    if not analysis.result_key:
+        return False
+    executed = Analysis.objects.filter(
+        result_key=analysis.result_key, analysis_status_id=EXECUTED
+    ).exclude(id=analysis_id).first()
+    if executed is None:
+        return False
+    Analysis.objects.filter(id=analysis_id).update(
+        result=executed.result, k_scores=executed.k_scores,
+        analysis_status_id=EXECUTED
+    )
+    return True
+
+
+def enqueue_analysis(analysis_id, analysis_type, arguments, docs,
+                     corpus=None):
+    """
+    Queue the execution of an analysis. When the docs come from a stored
+    dataset only the corpus settings are saved, and workers load the docs
+    from the corpus
+    """
+    payload = {
+        'arguments': arguments,
+        'docs': None if corpus else docs,
+        'corpus': corpus
+    }
+    job = AnalysisJob.objects.create(
+        analysis_id=analysis_id, analysis_type_id=analysis_type,
+        state=QUEUED,
+        payload=pickle.dumps(payload, protocol=pickle.HIGHEST_PROTOCOL)
+    )
+    set_analysis_status(analysis_id, QUEUED)
+    return job
+
+
+def claim_job(worker_id):
+    """
+    Claim the oldest queued job for the worker. The claim is a conditional
+    update, so a job can't be claimed by two workers even without row locks.
+    The claim also takes the result key of the analysis as the unique 
+    leader key of the job, so the jobs of identical analyses are not run 
+    at the same time, in this or any other process: they stay queued and 
+    reuse the result of the running one
+    """
+    running_keys = AnalysisJob.objects.filter(leader_key__isnull=False).\
+                   values('leader_key')
+    queued_jobs = AnalysisJob.objects.filter(state=QUEUED).exclude(
+        analysis__result_key__in=running_keys
+    ).order_by('id')
+    for job_id, result_key in queued_jobs.values_list(
+            'id', 'analysis__result_key')[:10]:
+        try:
+            with transaction.atomic():
+                claimed = AnalysisJob.objects.filter(
+                    id=job_id, state=QUEUED
+                ).update(
+                    state=IN_PROGRESS, worker=worker_id, 
+                    heartbeat=timezone.now(), attempts=F('attempts') + 1,
+                    leader_key=result_key
+                )
+        except IntegrityError:
+            # an identical analysis was claimed at the same time
+            continue
+        if claimed:
+            job = AnalysisJob.objects.get(id=job_id)
+            set_analysis_status(job.analysis_id, IN_PROGRESS)
+            return job
+    return None
+
+
+def release_job(job, error):
+    """
+    Queue a job again after its worker was lost, or mark it as failed if it
+    has reached the maximum number of attempts
+    """
+    state = QUEUED if job.attempts < MAX_ATTEMPTS else FAILED
+    AnalysisJob.objects.filter(id=job.id).update(
+        state=state, worker=None, error=error, leader_key=None
+    )
+    set_analysis_status(job.analysis_id, state)
+    if state == FAILED:
+        close_waiting_jobs(job.analysis_id, FAILED)
+    return state
+
+
+def fail_job(job, error):
+    """
+    Mark a job as failed after its analysis raised an error. The error 
+    would be raised again (e.g., bad arguments), so the job isn't retried
+    """
+    AnalysisJob.objects.filter(id=job.id).update(
+        state=FAILED, worker=None, error=error, leader_key=None
+    )
+    set_analysis_status(job.analysis_id, FAILED)
+    close_waiting_jobs(job.analysis_id, FAILED)
+
+
+def requeue_lost_jobs(worker_id=None):
+    """
+    Release the jobs of a worker that died or, if worker_id is None, the
+    running jobs that didn't send heartbeats for STALE_AFTER seconds
+    """
+    jobs = AnalysisJob.objects.filter(state=IN_PROGRESS)
+    if worker_id:
+        jobs = jobs.filter(worker=worker_id)
+    else:
+        limit = timezone.now() - timedelta(seconds=STALE_AFTER)
+        jobs = jobs.filter(heartbeat__lt=limit)
+    for job in jobs:
+        state = release_job(job, 'Worker {} was lost'.format(job.worker))
+        logger.warning('Job %s of a lost worker was %s', job.id,
+                       'requeued' if state == QUEUED else 'marked as failed')
+
+
+def send_heartbeats(job_id, stop_event):
+    while not stop_event.wait(HEARTBEAT_INTERVAL):
+        AnalysisJob.objects.filter(id=job_id).update(
+            heartbeat=timezone.now()
+        )
+    connection.close()
+
+
+def run_job(job):
+    """
+    Execute the analysis of a claimed job
+    """
+    # imported here since views enqueue jobs
+    from core.views import (
+        create_sentiment_analysis_results, create_document_clustering_results,
+        create_concept_extraction_results,
+        create_document_classification_results
+    )
+    target_functions = {
+        SENTIMENT_ANALYSIS: create_sentiment_analysis_results,
+        DOCUMENT_CLUSTERING: create_document_clustering_results,
+        CONCEPT_EXTRACTION: create_concept_extraction_results,
+        DOCUMENT_CLASSIFICATION: create_document_classification_results,
+    }
+    stop_event = Event()
+    heartbeat_thread = Thread(target=send_heartbeats,
+                              args=(job.id, stop_event,))
+    heartbeat_thread.setDaemon(True)
+    heartbeat_thread.start()
+    try:
+        # an identical analysis may have been executed while the job was 
+        # queued
+        if not reuse_executed_result(job.analysis_id):
+            payload = pickle.loads(job.payload)
+            corpus = payload['corpus']
+            docs = corpus.docs if corpus else payload['docs']
+            target_function = target_functions[job.analysis_type_id]
+            target_function(payload['arguments'], docs, job.analysis_id, 
+                            corpus)
+        AnalysisJob.objects.filter(id=job.id).update(
+            state=EXECUTED, worker=None, leader_key=None
+        )
+        close_waiting_jobs(job.analysis_id, EXECUTED)
+    except Exception:
+        logger.exception('Job %s failed', job.id)
+        fail_job(job, traceback.format_exc())
+    finally:
+        stop_event.set()
+        heartbeat_thread.join()
+
+
+def get_worker_id(pid):
+    return '{}:{}'.format(socket.gethostname(), pid)
+
+
+def worker_loop(poll_interval):
+    """
+    Main loop of a worker process: claim and run queued jobs one at a time
+    """
+    worker_id = get_worker_id(os.getpid())
+    logger.info('Analysis worker %s started', worker_id)
+    while True:
+        job = claim_job(worker_id)
+        if job is None:
+            time.sleep(poll_interval)
+            continue
+        logger.info('Worker %s running job %s', worker_id, job.id)
+        run_job(job)
@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+from analytics.resources import NLTK_DATA_DIR, download_resources
+
+
+class Command(BaseCommand):
+    help = 'Download the NLTK resources required by the analytics modules'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dir', default=NLTK_DATA_DIR,
+            help='Directory where the resources are stored'
+        )
+
+    def handle(self, *args, **options):
+        download_resources(options['dir'])
+        self.stdout.write(
+            'NLTK resources downloaded into {}'.format(options['dir'])
+        )
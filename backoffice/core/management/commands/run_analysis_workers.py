@@ -0,0 +1,71 @@
+import signal
+import time
+from multiprocessing import Process
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connections
+from core.jobs import worker_loop, requeue_lost_jobs, get_worker_id
+
+
+def run_worker(poll_interval):
+    # workers are stopped by the pool, so they die on SIGTERM instead of
+    # running the handler inherited from it
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    worker_loop(poll_interval)
+
+
+def stop_pool(signum, frame):
+    raise KeyboardInterrupt()
+
+
+class Command(BaseCommand):
+    help = 'Start a pool of worker processes that execute queued analyses'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--concurrency', type=int,
+            default=getattr(settings, 'ANALYSIS_WORKERS', 2),
+            help='Number of analyses executed at the same time'
+        )
+        parser.add_argument(
+            '--poll-interval', type=float, default=2,
+            help='Seconds between queries for new jobs of an idle worker'
+        )
+
+    def start_worker(self, poll_interval):
+        # each process must open its own database connection
+        connections.close_all()
+        worker = Process(target=run_worker, args=(poll_interval,))
+        worker.start()
+        return worker
+
+    def handle(self, *args, **options):
+        concurrency = options['concurrency']
+        poll_interval = options['poll_interval']
+        # release the jobs of workers that were running before a restart
+        requeue_lost_jobs()
+        # stop the workers too when the pool is stopped by a service manager
+        signal.signal(signal.SIGTERM, stop_pool)
+        workers = [self.start_worker(poll_interval)
+                   for i in range(concurrency)]
+        self.stdout.write('Started {} analysis workers'.format(concurrency))
+        try:
+            while True:
+                time.sleep(poll_interval)
+                for i, worker in enumerate(workers):
+                    if worker.is_alive():
+                        continue
+                    # the worker crashed: queue its job again and replace it
+                    requeue_lost_jobs(get_worker_id(worker.pid))
+                    self.stderr.write(
+                        'Worker {} died, restarting it'.format(worker.pid)
+                    )
+                    workers[i] = self.start_worker(poll_interval)
+                requeue_lost_jobs()
+        except KeyboardInterrupt:
+            for worker in workers:
+                worker.terminate()
+            for worker in workers:
+                worker.join()
+                # queue the interrupted job again
+                requeue_lost_jobs(get_worker_id(worker.pid))
@@ -0,0 +1,20 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11.5 on 2026-10-18 10:12
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0021_auto_20180208_1707'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='analysis',
+            name='result_key',
+            field=models.CharField(blank=True, db_index=True, max_length=64, null=True),
+        ),
+    ]
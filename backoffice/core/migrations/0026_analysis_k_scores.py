@@ -0,0 +1,21 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11.5 on 2026-10-18 18:05
+from __future__ import unicode_literals
+
+from django.db import migrations
+import django_mysql.models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0025_analysisjob_leader_key'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='analysis',
+            name='k_scores',
+            field=django_mysql.models.JSONField(blank=True, null=True),
+        ),
+    ]
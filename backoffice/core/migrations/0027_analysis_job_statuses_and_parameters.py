@@ -0,0 +1,87 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11.5 on 2026-10-18 18:20
+from __future__ import unicode_literals
+
+from django.db import migrations
+
+
+# Statuses of the analysis job queue
+ANALYSIS_STATUSES = [
+    (4, 'Queued'),
+    (5, 'Failed'),
+]
+
+# Parameters added since the initial fixtures, as
+# (id, name, default value, parameter type id, analysis type id)
+PARAMETERS = [
+    (25, 'n_jobs', '1', 1, 1),
+    (26, 'n_jobs', '1', 1, 2),
+    (27, 'n_jobs', '1', 1, 3),
+    (28, 'context_free_tagging', 'False', 4, 3),
+    (29, 'batch_size', '1000', 1, 2),
+    (30, 'streaming', 'False', 4, 2),
+    (31, 'random_state', '1', 1, 2),
+    (32, 'projection', '"auto"', 3, 2),
+    (33, 'memory_budget', '1024', 1, 2),
+    (34, 'compute_metrics', 'True', 4, 2),
+    (35, 'silhouette_sample_size', '5000', 1, 2),
+    (36, 'n_neighbors', '10', 1, 2),
+    (37, 'knn_svd_components', '100', 1, 2),
+    (38, 'k_range', '(2, 10)', 6, 2),
+    (39, 'selection_metric', '"silhouette"', 3, 2),
+    (40, 'n_components', 'None', 1, 2),
+    (41, 'deduplicate', 'False', 4, 1),
+    (42, 'deduplicate', 'False', 4, 2),
+    (43, 'deduplicate', 'False', 4, 3),
+    (44, 'init_from_analysis', 'None', 1, 2),
+    (45, 'vectorizer', '"tfidf"', 3, 2),
+    (46, 'n_features', '1048576', 1, 2),
+    (47, 'dtype', '"float32"', 3, 2),
+    (48, 'out_of_core', 'False', 4, 2),
+    (49, 'chunk_size', '10000', 1, 2),
+    (50, 'top_terms_method', '"pos"', 3, 2),
+]
+
+
+def add_statuses_and_parameters(apps, schema_editor):
+    AnalysisStatus = apps.get_model('core', 'AnalysisStatus')
+    Parameter = apps.get_model('core', 'Parameter')
+    ParameterType = apps.get_model('core', 'ParameterType')
+    # A new database gets these rows from the fixtures, loaded after
+    # the migrations
+    if not ParameterType.objects.exists():
+        return
+    for status_id, description in ANALYSIS_STATUSES:
+        AnalysisStatus.objects.update_or_create(
+            id=status_id, defaults={'description': description}
+        )
+    for (parameter_id, name, default_value, parameter_type_id, 
+         analysis_type_id) in PARAMETERS:
+        Parameter.objects.update_or_create(
+            id=parameter_id, 
+            defaults={
+                'name': name, 'default_value': default_value,
+                'parameter_type_id': parameter_type_id,
+                'analysis_type_id': analysis_type_id
+            }
+        )
+
+
+def remove_parameters(apps, schema_editor):
+    # The statuses are kept, deleting them would delete the analyses 
+    # that are queued or failed
+    Parameter = apps.get_model('core', 'Parameter')
+    Parameter.objects.filter(
+        id__in=[parameter[0] for parameter in PARAMETERS]
+    ).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0026_analysis_k_scores'),
+    ]
+
+    operations = [
+        migrations.RunPython(add_statuses_and_parameters, remove_parameters),
+    ]
@@ -87,6 +87,13 @@ class Analysis(models.Model):
     analysis_type = models.ForeignKey(AnalysisType, on_delete=models.CASCADE)
     analysis_status = models.ForeignKey(AnalysisStatus, on_delete=models.CASCADE)
     result = JSONField()
+    result_key = models.CharField(
+        max_length=64, blank=True, null=True, db_index=True
+    )
+    # Scores of the numbers of clusters tried by a document clustering whose
+    # number of clusters was selected automatically, a list of
+    # {"num_clusters", "score"} objects (serialized like result)
+    k_scores = JSONField(blank=True, null=True)
 
     def __str__(self):
         return self.name
@@ -96,3 +103,37 @@ class Argument(models.Model):
     value = models.CharField(max_length=150)
     parameter = models.ForeignKey(Parameter, on_delete=models.CASCADE)
     analysis = models.ForeignKey(Analysis, on_delete=models.CASCADE)
+
+
+class AnalysisModel(models.Model):
+    """
+    Fitted model of an analysis (e.g., the vectorizer and centroids of a
+    clustering) that can be applied later to new documents
+    """
+    analysis = models.OneToOneField(
+        Analysis, related_name='model', on_delete=models.CASCADE
+    )
+    data = models.BinaryField()
+    created = models.DateTimeField(auto_now_add=True)
+
+
+class AnalysisJob(models.Model):
+    analysis = models.OneToOneField(
+        Analysis, related_name='job', on_delete=models.CASCADE
+    )
+    analysis_type = models.ForeignKey(AnalysisType, on_delete=models.CASCADE)
+    # Mirrors the analysis status: queued, in progress, executed or failed
+    state = models.IntegerField(default=QUEUED, db_index=True)
+    payload = models.BinaryField()
+    attempts = models.IntegerField(default=0)
+    worker = models.CharField(max_length=150, blank=True, null=True)
+    heartbeat = models.DateTimeField(blank=True, null=True)
+    error = models.TextField(blank=True, null=True)
+    # Result key of the analysis while the job is running. Being unique, 
+    # only one job computes each result and the jobs of identical analyses
+    # wait for it
+    leader_key = models.CharField(
+        max_length=64, blank=True, null=True, unique=True
+    )
+    created = models.DateTimeField(auto_now_add=True)
+    modified = models.DateTimeField(auto_now=True)
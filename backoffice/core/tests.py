@@ -1,3 +1,129 @@
+import json
+import tempfile
+from unittest import mock
+from django.contrib.auth.models import User
 from django.test import TestCase
+from rest_framework.test import APIClient
+from analytics.clustering import DocumentClustering
+from core import corpus as corpus_module
+from core.corpus import DatasetCorpus
+from core.models import Analysis, AnalysisJob, Dataset
+from core.jobs import enqueue_analysis, claim_job, fail_job
+from core.views import save_analysis_model, load_analysis_model
+from core.constants import *
 
-# Create your tests here.
+
+class DatasetCorpusTestCase(TestCase):
+    fixtures = ['data.json']
+
+    def setUp(self):
+        self.corpora_dir = tempfile.TemporaryDirectory()
+        patcher = mock.patch.object(corpus_module, 'CORPORA_DIR', 
+                                    self.corpora_dir.name)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.addCleanup(self.corpora_dir.cleanup)
+        self.dataset = Dataset.objects.create(name='ideas', file='ideas.csv')
+        self.columns = ['text', 'label']
+
+    def test_labeled_and_unlabeled_corpora(self):
+        corpus = DatasetCorpus(self.dataset.id, self.columns)
+        labeled_corpus = DatasetCorpus(self.dataset.id, self.columns, 
+                                       labeled=True)
+        self.assertNotEqual(corpus.key, labeled_corpus.key)
+        self.assertNotEqual(corpus.directory, labeled_corpus.directory)
+        corpus.save_docs(['more bike lanes', 'a new park'])
+        labeled_corpus.save_docs([('more bike lanes', 'pos'), 
+                                  ('a new park', 'neg')])
+        # each kind of docs, and their layers, are loaded from their corpus
+        corpus = DatasetCorpus(self.dataset.id, self.columns)
+        labeled_corpus = DatasetCorpus(self.dataset.id, self.columns, 
+                                       labeled=True)
+        self.assertEqual(['more bike lanes', 'a new park'], corpus.docs)
+        self.assertEqual([('more bike lanes', 'pos'), ('a new park', 'neg')], 
+                         labeled_corpus.docs)
+        self.assertEqual(corpus.texts, labeled_corpus.texts)
+
+
+class AnalysisJobTestCase(TestCase):
+    fixtures = ['data.json']
+
+    def create_analysis(self, result_key='key'):
+        analysis = Analysis.objects.create(
+            name='clustering', analysis_type_id=DOCUMENT_CLUSTERING,
+            analysis_status_id=QUEUED, result='[]', result_key=result_key
+        )
+        enqueue_analysis(analysis.id, DOCUMENT_CLUSTERING, {}, ['an idea'])
+        return analysis
+
+    def test_identical_analyses_run_once(self):
+        leader = self.create_analysis()
+        follower = self.create_analysis()
+        other = self.create_analysis('other key')
+        self.assertEqual(leader.id, claim_job('worker-1').analysis_id)
+        # the identical analysis waits for the running one
+        self.assertEqual(other.id, claim_job('worker-2').analysis_id)
+        self.assertIsNone(claim_job('worker-2'))
+        # when the running analysis is deleted the waiting one is claimed
+        leader.delete()
+        self.assertEqual(follower.id, claim_job('worker-2').analysis_id)
+
+    def test_failed_analysis_fails_waiting_ones(self):
+        self.create_analysis()
+        follower = self.create_analysis()
+        fail_job(claim_job('worker-1'), 'error')
+        self.assertEqual(FAILED, AnalysisJob.objects.get(
+            analysis_id=follower.id).state)
+        self.assertEqual(FAILED, Analysis.objects.get(
+            id=follower.id).analysis_status_id)
+        self.assertIsNone(claim_job('worker-1'))
+
+
+class DocumentClusteringAssignTestCase(TestCase):
+    fixtures = ['data.json']
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(
+            User.objects.create_user('analyst', password='analyst')
+        )
+        # models are cached by analysis id
+        load_analysis_model.cache_clear()
+        self.docs = ['more protected bike lanes downtown', 
+                     'bike lanes on every main street',
+                     'safer bike lanes for kids riding to school',
+                     'a new park with trees and benches',
+                     'a bigger park with a playground for kids',
+                     'clean the park and plant more trees']
+        self.dc = DocumentClustering(num_clusters=2, min_df=1, max_df=1.0,
+                                     compute_metrics=False)
+        self.dc.clustering(self.docs)
+
+    def create_analysis(self, analysis_status):
+        analysis = Analysis.objects.create(
+            name='clustering', analysis_type_id=DOCUMENT_CLUSTERING,
+            analysis_status_id=analysis_status, result='[]'
+        )
+        save_analysis_model(analysis.id, self.dc.export_model())
+        return analysis
+
+    def assign(self, analysis, docs):
+        return self.client.post(
+            '/api/analysis/doc-clustering/{}/assign/'.format(analysis.id),
+            {'data_object': json.dumps(docs)}
+        )
+
+    def test_assign_new_docs(self):
+        analysis = self.create_analysis(EXECUTED)
+        response = self.assign(analysis, self.docs)
+        self.assertEqual(200, response.status_code)
+        # docs of the clustering are assigned to their own clusters
+        self.assertEqual(
+            [{'idea': doc, 'cluster': label} 
+             for doc, label in zip(self.docs, self.dc.labels)],
+            response.data
+        )
+
+    def test_assign_to_unexecuted_clustering(self):
+        analysis = self.create_analysis(IN_PROGRESS)
+        self.assertEqual(400, self.assign(analysis, self.docs).status_code)
@@ -7,10 +7,11 @@ from rest_framework.permissions import IsAdminUser
 from django.contrib.auth.hashers import make_password
 from django.contrib.auth.models import Group, Permission
 from django.db import transaction
+from django.http import Http404
 from django.shortcuts import get_object_or_404
 from core.models import (
     User, Project, Dataset, Attribute, Analysis, Parameter, 
-    CreationStatus, AnalysisStatus
+    CreationStatus, AnalysisStatus, AnalysisModel
 )
 from core.serializers import (
     UserSerializer, DatasetSerializer, ProjectGetSerializer, 
@@ -18,20 +19,44 @@ from core.serializers import (
     ArgumentSerializer, ParameterSerializer,
 )
 from core.constants import *
+from core.corpus import DatasetCorpus
+from core.jobs import enqueue_analysis
 from analytics.sentiment_analysis import SentimentAnalyzer
 from analytics.clustering import DocumentClustering
 from analytics.concept_extraction import ConceptExtractor
 from analytics.classification import DocumentClassifier
+from analytics.deduplication import DuplicateDetector
+from analytics.streaming import StreamingDocumentClustering
 from datetime import datetime
-from threading import Thread
+from functools import lru_cache
 import pandas as pd
 import numpy as np
-import json, os, re, ast
+import json, os, re, ast, hashlib, pickle
 import logging
 
 
 logger = logging.getLogger(__name__)
 
+# Arguments that change how an analysis is executed but not its results
+EXECUTION_ARGUMENTS = ('n_jobs',)
+
+# Arguments of the clustering analyses used by the out-of-core clustering
+STREAMING_CLUSTERING_ARGUMENTS = (
+    'num_clusters', 'context_words', 'ngram_range', 'consider_urls', 
+    'language', 'n_features', 'batch_size', 'random_state', 'dtype', 'n_jobs'
+)
+
+# Number of rows of the dataset file read at a time by the out-of-core
+# clustering
+CHUNK_SIZE = 10000
+
+# Maximum number of ideas of each cluster kept in the results of the 
+# out-of-core clustering, so memory doesn't depend on the size of the dataset
+OUT_OF_CORE_SAMPLE_SIZE = 1000
+
+# Number of fitted models kept in memory to assign new documents
+MODEL_CACHE_SIZE = 16
+
 
 # ---
 # General methods 
@@ -85,6 +110,34 @@ def read_stored_dataset(dataset_id, attributes):
     return dataset
 
 
+def read_stored_docs_chunks(dataset_id, attributes, chunksize=CHUNK_SIZE):
+    """
+    Read the docs of a stored dataset in chunks of rows, without loading 
+    the whole file
+    """
+    ds = Dataset.objects.get(id=dataset_id)
+    ds_file = 'datasets/'+str(ds.file)
+    chunks = pd.read_csv(ds_file, sep = None, engine='python', 
+                         usecols=attributes, chunksize=chunksize)
+    for chunk in chunks:
+        chunk = chunk[attributes].dropna()
+        if len(chunk):
+            yield create_docs(chunk)
+
+
+def get_dataset_file_hash(dataset_id):
+    """
+    Hash of the content of the file of a stored dataset, read in blocks so
+    the file is never loaded whole
+    """
+    ds = Dataset.objects.get(id=dataset_id)
+    content_hash = hashlib.sha256()
+    with open('datasets/'+str(ds.file), 'rb') as f:
+        for block in iter(lambda: f.read(2 ** 20), b''):
+            content_hash.update(block)
+    return content_hash.hexdigest()
+
+
 def read_in_memory_dataset(datasetFile, attributes):
     """
     Read in memory dataset
@@ -129,6 +182,19 @@ def get_attributes(dataset_id):
     return attributes
 
 
+def get_dataset_columns(dataset_id):
+    """
+    Get the columns of a stored dataset used for analysis. The label column,
+    if any, is the last one
+    """
+    label_column = "label"
+    data_columns = list(get_attributes(dataset_id))
+    if label_column in data_columns:
+        data_columns.remove(label_column)
+        data_columns.append(label_column)
+    return data_columns
+
+
 def modify_project_updated_field(project_id):
     """
     Update the updated field of a project with the current time
@@ -172,17 +238,45 @@ def create_dev_docs(dataset):
     return ds_list_of_tuples
 
 
+def get_dataset_corpus(dataset_id, data_columns, analysis_type, arguments):
+    """
+    Get the preprocessed corpus of a stored dataset for the preprocessing 
+    settings of an analysis. The docs are created from the dataset file the
+    first time the corpus is used.
+    """
+    corpus = DatasetCorpus(
+        dataset_id, data_columns,
+        language=arguments.get('language', 'english'),
+        context_words=arguments.get('context_words', []),
+        consider_urls=arguments.get('consider_urls', False),
+        n_jobs=arguments.get('n_jobs', 1),
+        labeled=analysis_type == DOCUMENT_CLASSIFICATION
+    )
+    if corpus.docs is None:
+        dataset = read_stored_dataset(dataset_id, data_columns)
+        if corpus.labeled:
+            corpus.save_docs(create_dev_docs(dataset))
+        else:
+            corpus.save_docs(create_docs(dataset))
+    return corpus
+
+
 def get_analysis_related_fields(request, analysis_type):
     """
     Get the project_id, dataset_id and arguments from the request
     Create the docs for analysis from the supplied data
+    When the data come from a stored dataset, get also its preprocessed 
+    corpus
     """
     project_id = None
     dataset_id = None
+    corpus = None
     if request.data.get('parameters'):
         arguments = ast.literal_eval(request.data['parameters'])
     else:
         arguments = {}
+    if analysis_type == DOCUMENT_CLUSTERING:
+        check_init_from_analysis(arguments)
     if request.data.get('data_object'):
         if analysis_type == DOCUMENT_CLASSIFICATION:
             docs = ast.literal_eval(request.data['data_object'])
@@ -197,12 +291,14 @@ def get_analysis_related_fields(request, analysis_type):
         if  request.data.get('project_id') and request.data.get('dataset_id'):
             project_id = request.data['project_id']
             dataset_id = request.data['dataset_id']
-            data_columns = get_attributes(dataset_id)
-            data_columns = list(data_columns)
-            if label_column in data_columns:
-                data_columns.remove(label_column)
-                data_columns.append(label_column)
-            dataset = read_stored_dataset(dataset_id, data_columns)
+            if analysis_type == DOCUMENT_CLUSTERING and \
+               arguments.get('out_of_core'):
+                # the docs are streamed from the dataset file by the job
+                return project_id, dataset_id, arguments, None, None
+            data_columns = get_dataset_columns(dataset_id)
+            corpus = get_dataset_corpus(
+                dataset_id, data_columns, analysis_type, arguments
+            )
         else:
             data_columns = json.loads(request.data['data_columns'])
             if label_column in data_columns:
@@ -214,12 +310,42 @@ def get_analysis_related_fields(request, analysis_type):
             elif request.data.get('data_url'):
                 data = request.data['data_url']
                 dataset = read_dataset_from_url(data, data_columns)
-        if analysis_type == DOCUMENT_CLASSIFICATION:
+        if corpus:
+            docs = corpus.docs
+        elif analysis_type == DOCUMENT_CLASSIFICATION:
             docs = create_dev_docs(dataset)
         else:
             docs = create_docs(dataset)
 
-    return project_id, dataset_id, arguments, docs
+    return project_id, dataset_id, arguments, docs, corpus
+
+
+def get_duplicate_detector(arguments, docs, corpus=None):
+    """
+    Pop the deduplicate argument and, if it is set, group the near-duplicate
+    docs so the analysis runs on one representative per group
+    Return None if the docs aren't deduplicated
+    """
+    if not arguments.pop('deduplicate', False):
+        return None
+    detector = DuplicateDetector(
+        language=arguments.get('language', 'english'),
+        context_words=arguments.get('context_words', []),
+        consider_urls=arguments.get('consider_urls', False),
+        n_jobs=arguments.get('n_jobs', 1)
+    )
+    detector.fit(docs, corpus.tokens() if corpus else None)
+    return detector
+
+
+def get_representatives(items, detector):
+    """
+    Get the items (docs or any of their preprocessing layers) of the 
+    representatives of the groups of near-duplicates
+    """
+    if detector is None:
+        return items
+    return [items[i] for i in detector.representatives]
 
 
 def create_arguments(analysis_type, arguments):
@@ -278,32 +404,133 @@ def save_analysis(analysis, arguments, analysis_type, project_id):
         return resp
 
 
-def update_analysis(analysis_id, results):
+def get_result_key(docs, data_columns, analysis_type, arguments):
+    """
+    Get the key that identifies the results of an analysis: a hash of the
+    content of the docs, the selected columns, the analysis type and the 
+    arguments normalized with the default values of the parameters
     """
-    Update analysis result and status
+    normalized_arguments = {}
+    parameters = Parameter.objects.filter(analysis_type_id = analysis_type)
+    for p in parameters:
+        normalized_arguments[p.name] = ast.literal_eval(p.default_value)
+    normalized_arguments.update(arguments)
+    for name in EXECUTION_ARGUMENTS:
+        normalized_arguments.pop(name, None)
+    content_hash = hashlib.sha256()
+    for doc in docs:
+        content_hash.update(repr(doc).encode('utf-8'))
+    key = json.dumps(
+        [content_hash.hexdigest(), data_columns, analysis_type, 
+         normalized_arguments],
+        sort_keys=True, default=str
+    )
+    return hashlib.sha256(key.encode('utf-8')).hexdigest()
+
+
+def update_analysis(analysis_id, results, k_scores=None):
+    """
+    Update analysis result, scores of the numbers of clusters (if they were
+    selected automatically) and status
+    The analyses waiting for the same result are updated too
     """
     analysis = get_object(Analysis, analysis_id)
     results = json.dumps(results)
+    if k_scores is not None:
+        k_scores = json.dumps(k_scores)
     analysis.result = results
+    analysis.k_scores = k_scores
     analysis.analysis_status = AnalysisStatus.objects.get(id=EXECUTED)
     analysis.save()
+    if analysis.result_key:
+        Analysis.objects.filter(
+            result_key=analysis.result_key, 
+            analysis_status_id__in=[QUEUED, IN_PROGRESS]
+        ).update(result=results, k_scores=k_scores,
+                 analysis_status_id=EXECUTED)
 
 
-def create_sentiment_analysis_results(arguments, docs, analysis_id):
+def save_analysis_model(analysis_id, model):
+    """
+    Save the fitted model of an analysis
     """
-    Non-blocking thread to create the results of a sentiment analysis
+    AnalysisModel.objects.update_or_create(
+        analysis_id=analysis_id, 
+        defaults={
+            'data': pickle.dumps(model, protocol=pickle.HIGHEST_PROTOCOL)
+        }
+    )
+
+
+def get_analysis_model(analysis):
+    """
+    Get the stored model of an analysis or, if the analysis reused the 
+    results of an identical analysis, its model. None if there isn't any
+    """
+    analysis_model = AnalysisModel.objects.filter(analysis=analysis).first()
+    if analysis_model is None and analysis.result_key:
+        analysis_model = AnalysisModel.objects.filter(
+            analysis__result_key=analysis.result_key
+        ).first()
+    return analysis_model
+
+
+def check_init_from_analysis(arguments):
+    """
+    Check that the analysis whose model initializes a clustering is an 
+    executed clustering with a stored model
+    """
+    init_from_analysis = arguments.get('init_from_analysis')
+    if not init_from_analysis:
+        return
+    analysis = Analysis.objects.filter(
+        id=int(init_from_analysis), analysis_type_id=DOCUMENT_CLUSTERING,
+        analysis_status_id=EXECUTED
+    ).first()
+    if analysis is None or get_analysis_model(analysis) is None:
+        raise ValueError('init_from_analysis must be an executed document '
+                         'clustering analysis with a stored model')
+
+
+@lru_cache(maxsize=MODEL_CACHE_SIZE)
+def load_analysis_model(analysis_id):
+    """
+    Load the fitted model of an analysis. Analyses that reused the results
+    of an identical analysis use its model
+    """
+    analysis = get_object(Analysis, analysis_id)
+    analysis_model = get_analysis_model(analysis)
+    if analysis_model is None:
+        raise Http404
+    return pickle.loads(analysis_model.data)
+
+
+def create_sentiment_analysis_results(arguments, docs, analysis_id, 
+                                      corpus=None):
+    """
+    Job to create the results of a sentiment analysis
     Change the analysis_status and the results fields of a created analysis
     """
     # Call sentiment analizer
+    detector = get_duplicate_detector(arguments, docs, corpus)
     sa = SentimentAnalyzer(**arguments)
-    sa.analyze_docs(docs) 
+    if corpus and not sa.translate:
+        sa.analyze_docs(get_representatives(docs, detector), 
+                        get_representatives(corpus.sentiment_docs(), detector))
+    else:
+        sa.analyze_docs(get_representatives(docs, detector)) 
+    tagged_docs = sa.tagged_docs
+    if detector:
+        # each doc gets the sentiment of the representative of its group
+        tagged_docs = [(doc, sentiment, score) for doc, (_, sentiment, score)
+                       in zip(docs, detector.expand(tagged_docs))]
 
     # Get results
     results = []
     neg_ideas = []
     neu_ideas = []
     pos_ideas = []
-    for t in sa.tagged_docs:            
+    for t in tagged_docs:            
         doc, sentiment, score = (t[i] for i in range(3))
         idea = {"idea":doc, "score":score}
         if sentiment == "neg":
@@ -325,19 +552,58 @@ def create_sentiment_analysis_results(arguments, docs, analysis_id):
     update_analysis(analysis_id, results)
         
 
-def create_document_clustering_results(arguments, docs, analysis_id):
+def create_document_clustering_results(arguments, docs, analysis_id,
+                                       corpus=None):
     """
-    Non-blocking thread to create the results of a clustering analysis
+    Job to create the results of a clustering analysis
     Change the analysis_status and the results fields of a created analysis
     """
+    if arguments.pop('out_of_core', False) and docs is None:
+        return create_out_of_core_clustering_results(arguments, analysis_id)
+    arguments.pop('chunk_size', None)
     # Call document clustering
-    dc = DocumentClustering(**arguments)
-    dc.clustering(docs)
+    detector = get_duplicate_detector(arguments, docs, corpus)
+    # warm start from the centroids of a previous clustering
+    init_from_analysis = arguments.pop('init_from_analysis', None)
+    if init_from_analysis:
+        arguments['init_model'] = load_analysis_model(int(init_from_analysis))
+    rep_docs = get_representatives(docs, detector)
+    weights = detector.weights if detector else None
+    if corpus:
+        # hierarchical clusterings are cut from the tree saved in the corpus,
+        # which is built from all the docs
+        cache_dir = None if detector else corpus.directory
+        dc = DocumentClustering(cache_dir=cache_dir, **arguments)
+        stems = None
+        if not dc.has_cached_tree():
+            stems = get_representatives(corpus.stems(join_words=True), 
+                                        detector)
+        # the part-of-speech tags are only needed by the pos top terms
+        if dc.top_terms_method == 'pos':
+            dc.clustering(rep_docs, stems, 
+                          get_representatives(corpus.pos_tags(), detector),
+                          weights)
+        else:
+            dc.clustering(rep_docs, stems, sample_weight=weights,
+                          tokenized_docs=get_representatives(corpus.tokens(),
+                                                             detector))
+    else:
+        dc = DocumentClustering(**arguments)
+        dc.clustering(rep_docs, sample_weight=weights)
 
     # Get results
     results = []
+    num_clusters = dc.selected_num_clusters
+    # scores of the numbers of clusters tried when num_clusters is 'auto',
+    # stored in the k_scores field of the analysis
+    k_scores = [{"num_clusters":k, "score":score} 
+                for k, score in sorted(dc.k_scores.items())] or None
     vec = dc.get_coordinate_vectors()
-    ideas_clusters = [[] for x in range(dc.num_clusters)] 
+    if detector:
+        # each doc gets the cluster and the position of its representative
+        vec = dict(x=detector.expand(vec["x"]), y=detector.expand(vec["y"]),
+                   label=detector.expand(vec["label"]), docs=docs)
+    ideas_clusters = [[] for x in range(num_clusters)] 
     num_docs = len(vec["docs"])
     for i in range(num_docs):
         doc = vec["docs"][i]            
@@ -348,15 +614,15 @@ def create_document_clustering_results(arguments, docs, analysis_id):
         ideas_clusters[cluster].append(idea) 
     
     top_terms = dc.top_terms_per_cluster()
-    top_terms_clusters = [[] for x in range(dc.num_clusters)]
-    for cluster in range(dc.num_clusters):
+    top_terms_clusters = [[] for x in range(num_clusters)]
+    for cluster in range(num_clusters):
         for tup in top_terms[str(cluster)]:
             term = tup[0]
             score = tup[1]
             top_term = {"term":term, "score":score}
             top_terms_clusters[cluster].append(top_term)
 
-    for i in range(dc.num_clusters):
+    for i in range(num_clusters):
         cluster = {
             "cluster":i, 
             "top_terms": top_terms_clusters[i], 
@@ -364,18 +630,85 @@ def create_document_clustering_results(arguments, docs, analysis_id):
         }
         results.append(cluster)
 
+    # Save the model used to assign new docs to the clusters
+    save_analysis_model(analysis_id, dc.export_model())
+
+    # Update analysis 
+    update_analysis(analysis_id, results, k_scores)
+
+
+def create_out_of_core_clustering_results(arguments, analysis_id):
+    """
+    Job to create the results of a clustering analysis whose docs are 
+    streamed from the file of its dataset
+    Change the analysis_status and the results fields of a created analysis
+    """
+    if arguments.get('num_clusters') == 'auto':
+        raise ValueError('The number of clusters must be given to cluster '
+                         'out of core')
+    analysis = get_object(Analysis, analysis_id)
+    data_columns = get_dataset_columns(analysis.dataset_id)
+    chunk_size = arguments.get('chunk_size', CHUNK_SIZE)
+    read_chunks = lambda: read_stored_docs_chunks(
+        analysis.dataset_id, data_columns, chunk_size
+    )
+    # Call out-of-core document clustering
+    sdc = StreamingDocumentClustering(**{
+        name: arguments[name] for name in STREAMING_CLUSTERING_ARGUMENTS
+        if name in arguments
+    })
+    sdc.fit(read_chunks)
+
+    # Get results, keeping a uniform sample of the ideas of each cluster 
+    # (reservoir sampling)
+    results = []
+    rng = np.random.RandomState(sdc.random_state)
+    ideas_clusters = [[] for x in range(sdc.num_clusters)]
+    num_ideas = [0] * sdc.num_clusters
+    for docs, labels, coords in sdc.assign(read_chunks):
+        for doc, cluster, (x, y) in zip(docs, labels, coords):
+            idea = {"idea":doc, "posx":float(x), "posy":float(y)}
+            num_ideas[cluster] += 1
+            if len(ideas_clusters[cluster]) < OUT_OF_CORE_SAMPLE_SIZE:
+                ideas_clusters[cluster].append(idea)
+            else:
+                i = rng.randint(num_ideas[cluster])
+                if i < OUT_OF_CORE_SAMPLE_SIZE:
+                    ideas_clusters[cluster][i] = idea
+
+    top_terms = sdc.top_terms_per_cluster()
+    for i in range(sdc.num_clusters):
+        cluster = {
+            "cluster":i, 
+            "top_terms": [{"term":term, "score":score} 
+                          for term, score in top_terms[str(i)]], 
+            "ideas":ideas_clusters[i],
+            "num_ideas":num_ideas[i]
+        }
+        results.append(cluster)
+
     # Update analysis 
     update_analysis(analysis_id, results)
 
 
-def create_concept_extraction_results(arguments, docs, analysis_id):
+def create_concept_extraction_results(arguments, docs, analysis_id,
+                                      corpus=None):
     """
-    Non-blocking thread to create the results of a concept extraction analysis
+    Job to create the results of a concept extraction analysis
     Change the analysis_status and the results fields of a created analysis
     """
     # Call concept extractor
+    detector = get_duplicate_detector(arguments, docs, corpus)
+    rep_docs = get_representatives(docs, detector)
+    weights = detector.weights if detector else None
     ce = ConceptExtractor(**arguments)
-    ce.extract_concepts(docs)
+    if corpus:
+        tagged_docs = corpus.pos_tags(ce.context_free_tagging)
+        ce.extract_concepts(rep_docs, 
+                            get_representatives(tagged_docs, detector), 
+                            weights)
+    else:
+        ce.extract_concepts(rep_docs, doc_weights=weights)
 
     # Get results
     results = []
@@ -388,14 +721,18 @@ def create_concept_extraction_results(arguments, docs, analysis_id):
     update_analysis(analysis_id, results)
 
 
-def create_document_classification_results(arguments, docs, analysis_id):
+def create_document_classification_results(arguments, docs, analysis_id,
+                                           corpus=None):
     """
-    Non-blocking thread to create the results of a classification analysis
+    Job to create the results of a classification analysis
     Change the analysis_status and the results fields of a created analysis
     """    
     # Call document classifier
     dc = DocumentClassifier(**arguments)
-    dc.classify_docs(docs)
+    if corpus:
+        dc.classify_docs(docs, corpus.pos_tags())
+    else:
+        dc.classify_docs(docs)
 
     # Get results
     results = []
@@ -460,44 +797,57 @@ def post_analysis(request, analysis_type):
     """
     # Get analysis related data
     try:    
-        project_id, dataset_id, arguments, docs = \
+        project_id, dataset_id, arguments, docs, corpus = \
         get_analysis_related_fields(request, analysis_type)
     except Exception as ex:
         response = Response(status=status.HTTP_400_BAD_REQUEST)
         response.content = ex
         return response
    
-    analysis_status = IN_PROGRESS
+    analysis_status = QUEUED
     results = json.dumps([])
+    data_columns = corpus.columns if corpus else \
+                   request.data.get('data_columns')
+    key_docs = docs
+    if docs is None:
+        # out-of-core analyses are identified by the content of their 
+        # dataset file
+        key_docs = [get_dataset_file_hash(dataset_id)]
+        data_columns = get_dataset_columns(dataset_id)
+    result_key = get_result_key(key_docs, data_columns, analysis_type, 
+                                arguments)
     
+    # Reuse the result of an identical analysis if there is one already
+    # executed
+    cached_analysis = Analysis.objects.filter(
+        result_key=result_key, analysis_status_id=EXECUTED
+    ).first()
+    k_scores = None
+    if cached_analysis:
+        analysis_status = EXECUTED
+        results = cached_analysis.result
+        k_scores = cached_analysis.k_scores
+
     # Create analysis
     analysis = {
         'name': request.data['name'], 'project': project_id,
         'dataset': dataset_id, 'analysis_type': analysis_type,
-        'analysis_status':analysis_status, 'result': results
+        'analysis_status':analysis_status, 'result': results,
+        'result_key': result_key, 'k_scores': k_scores
     }           
     response = save_analysis(
         analysis, arguments, analysis_type, project_id
     )
+
+    if cached_analysis:
+        return response
    
-    # Get target thread function
-    if analysis_type ==  SENTIMENT_ANALYSIS:
-        target_function = create_sentiment_analysis_results
-    elif analysis_type == DOCUMENT_CLUSTERING:
-        target_function = create_document_clustering_results
-    elif analysis_type == CONCEPT_EXTRACTION:
-        target_function = create_concept_extraction_results
-    elif analysis_type == DOCUMENT_CLASSIFICATION:
-        target_function = create_document_classification_results
-
-    # Create analysis results in a non-blocking thread
+    # Queue the analysis, its results are created by the analysis workers
+    # (see the run_analysis_workers command). If an identical analysis is
+    # in progress, in this or any other process, the job waits for it and
+    # reuses its result (see claim_job)
     analysis_id = response.data['id']
-    analysis_thread = Thread(
-        target=target_function, 
-        args=(arguments,docs,analysis_id,)
-    )
-    analysis_thread.setDaemon(True)
-    analysis_thread.start()
+    enqueue_analysis(analysis_id, analysis_type, arguments, docs, corpus)
 
     return response
 
@@ -591,6 +941,7 @@ class DatasetDetail(APIView):
     def delete(self, request, pk, format=None):
         dataset = get_object(Dataset, pk)
         dataset.file.delete()
+        DatasetCorpus.delete_all(pk)
         dataset.delete()
         return Response(status=status.HTTP_204_NO_CONTENT)
 
@@ -851,6 +1202,36 @@ class DocumentClassificationList(AnalysisObjectList):
         return post_analysis(request, DOCUMENT_CLASSIFICATION)
 
 
+class DocumentClusteringAssign(APIView):
+    def post(self, request, pk, format=None):
+        """
+        desc: Assign new documents to the clusters of an executed clustering
+        parameters:
+        - name: data_object
+          desc: "[\\"text 1\\",\\"text 2\\",\\"text n\\"]"
+          type: string
+          required: true
+          location: form
+        """
+        analysis = get_object(Analysis, pk)
+        try:
+            if analysis.analysis_type_id != DOCUMENT_CLUSTERING or \
+               analysis.analysis_status_id != EXECUTED:
+                raise ValueError('The analysis is not an executed clustering')
+            docs = json.loads(request.data['data_object'])
+            if not is_list_of_strings(docs):
+                raise ValueError('Bad data_object format')
+        except Exception as ex:
+            response = Response(status=status.HTTP_400_BAD_REQUEST)
+            response.content = ex
+            return response
+        model = load_analysis_model(analysis.id)
+        labels = model.assign(docs)
+        results = [{"idea":doc, "cluster":int(label)} 
+                   for doc, label in zip(docs, labels)]
+        return Response(results)
+
+
 class SentimentAnalysisDetail(AnalysisObjectDetail): pass
 class DocumentClusteringDetail(AnalysisObjectDetail): pass
 class ConceptExtractionDetail(AnalysisObjectDetail): pass